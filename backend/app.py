@@ -2,33 +2,89 @@
 # app.py — FINAL VERSION WITH FULL ACTIVITY LOGGING
 # --------------------------------------------------------------
 
-from flask import Flask, request, jsonify
+import base64
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from auth import (
+    HashPoolBusy,
+    create_stream_ticket,
     hash_password,
-    verify_password,
+    check_password,
     create_jwt,
-    jwt_required
+    jwt_required,
+    revoke_jwt,
+    token_cache
 )
 
+import compress
+import events
+import fastjson
+import metrics
+import ratelimit
+
 from models import (
-    db, gen_id, now_iso,
-    find_one, find, insert, update, delete,
-    add_member, remove_member,
+    db, gen_id, gen_ids, now_iso,
+    find_one, find, query_sorted, insert, insert_unique, update, delete, apply_changes,
+    reading, writing,
+    add_member, remove_member, member_role, get_user_projects,
+    get_project_members,
 
     # Chat helpers
     create_chat_thread, get_chat_threads_by_project, update_chat_thread, delete_chat_thread,
+    append_chat_message, get_chat_messages,
 
     # Activity helpers
-    log_activity, get_project_activities
+    log_activity, log_activities_bulk, get_project_activities,
+    LOGIN_COALESCE_SECONDS,
+
+    # Versions
+    versions, project_version, changes_since,
+    revocations,
+
+    # Search
+    search_project, SEARCH_FIELDS,
+
+    # Dashboard
+    project_summary
 )
 
 # --------------------------------------------------------------
 # APP + CORS SETUP
 # --------------------------------------------------------------
 
+class JSONProvider(DefaultJSONProvider):
+    """
+    jsonify() and request JSON through fastjson (orjson when installed),
+    which also serializes the slotted records of the in-memory engine.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return fastjson.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return fastjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(fastjson.dumps_bytes(obj) + b"\n",
+                                        mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = JSONProvider(app)
+# With SQLite storage a logout must reach every worker, not just this one.
+token_cache.shared = revocations
 
 @app.before_request
 def handle_options():
@@ -50,7 +106,7 @@ CORS(
     resources={r"/*": {"origins": ["http://localhost:9002"]}},
     supports_credentials=True,
     allow_headers=["Authorization", "Content-Type"],
-    expose_headers=["Authorization"],
+    expose_headers=["Authorization", "X-Next-Cursor", "ETag", "Retry-After"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 
@@ -61,6 +117,12 @@ CORS(
 def error(msg, code=400):
     return jsonify({"error": msg}), code
 
+@app.errorhandler(HashPoolBusy)
+def hash_pool_busy(_exc):
+    response, code = error("server busy, retry shortly", 503)
+    response.headers["Retry-After"] = "1"
+    return response, code
+
 def user_public(u):
     return {
         "id": u["id"],
@@ -69,9 +131,341 @@ def user_public(u):
         "status": u.get("status", "offline"),
     }
 
+ACTIVITY_PAGE_DEFAULT = 50
+ACTIVITY_PAGE_MAX = 500
+MESSAGE_PAGE_DEFAULT = 50
+MESSAGE_PAGE_MAX = 200
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 100
+LIST_PAGE_DEFAULT = 100
+LIST_PAGE_MAX = 1000
+
+def page_limit(default, maximum):
+    """Parse ?limit=, clamped to ``maximum``; None when it is not a positive int."""
+    raw = request.args.get("limit")
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    return min(limit, maximum)
+
+# Sort fields whose keys are ranks rather than strings.
+PRIORITY_RANK_FIELDS = {"priority"}
+
+def encode_cursor(sort, key):
+    (missing, value), obj_id = key
+    raw = json.dumps([sort, missing, value, obj_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(sort, raw):
+    """The (sort key, id) a cursor from encode_cursor() holds; None if invalid."""
+    try:
+        padded = raw + "=" * (-len(raw) % 4)
+        cursor_sort, missing, value, obj_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    if cursor_sort != sort or not isinstance(obj_id, str):
+        return None
+    # The key has to compare with the index's own keys (see sort_key).
+    expected = str if missing or sort not in PRIORITY_RANK_FIELDS else int
+    if missing not in (0, 1) or type(value) is not expected or (missing and value):
+        return None
+    return ((missing, value), obj_id)
+
+def parse_time(raw):
+    """ISO-8601 timestamp -> UTC ISO string as stored by now_iso(); None if invalid."""
+    try:
+        dt = datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+# Query parameters that switch the list endpoints to sorted, paged results.
+LIST_QUERY_PARAMS = {"sort", "order", "limit", "after", "updatedAfter"}
+
+def list_response(collection, projectId, filters, sorts):
+    """
+    GET /api/tasks and /api/milestones. Without filter, sort or paging
+    parameters this is the whole project, as before; with any of them a
+    sorted page served from the ordered indexes, continued with
+    ``after=<X-Next-Cursor>``. ``sorts`` maps each sort field to whether
+    it runs newest/highest first by default; the first is the default.
+    """
+    args = request.args
+    if not (LIST_QUERY_PARAMS | set(filters)) & set(args):
+        return project_response(projectId, lambda: (find(collection, projectId=projectId), {}))
+
+    sort = args.get("sort", next(iter(sorts)))
+    if sort not in sorts:
+        return error(f"sort must be one of: {', '.join(sorts)}")
+    order = args.get("order", "desc" if sorts[sort] else "asc")
+    if order not in ("asc", "desc"):
+        return error("order must be asc or desc")
+
+    limit = page_limit(LIST_PAGE_DEFAULT, LIST_PAGE_MAX)
+    if limit is None:
+        return error("limit must be a positive integer")
+
+    after = None
+    if args.get("after"):
+        after = decode_cursor(sort, args["after"])
+        if after is None:
+            return error("invalid cursor")
+
+    equals = {"projectId": projectId}
+    equals.update({f: args[f] for f in filters if f in args})
+
+    greater = {}
+    if "updatedAfter" in args:
+        greater["updatedAt"] = parse_time(args["updatedAfter"])
+        if greater["updatedAt"] is None:
+            return error("updatedAfter must be an ISO-8601 timestamp")
+
+    def build():
+        rows, next_key = query_sorted(collection, sort, equals, desc=order == "desc",
+                                      after=after, greater=greater, limit=limit)
+        headers = {}
+        if next_key is not None:
+            headers["X-Next-Cursor"] = encode_cursor(sort, next_key)
+        return rows, headers
+
+    return project_response(projectId, build)
+
+# Serialized list responses kept per (path + query, project version).
+RESPONSE_CACHE_SIZE = int(os.environ.get("MILESTACK_RESPONSE_CACHE_SIZE", 1024))
+# Total bytes of cached bodies, compressed variants included.
+RESPONSE_CACHE_BYTES = int(os.environ.get("MILESTACK_RESPONSE_CACHE_BYTES", 64 * 2 ** 20))
+# Lists longer than this are streamed in chunks instead (0 = never stream).
+STREAM_ROWS = int(os.environ.get("MILESTACK_STREAM_ROWS", 2000))
+# Versions are only comparable within one store, so ETags carry its tag.
+ETAG_EPOCH = versions.epoch
+
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+_response_cache_bytes = 0
+
+def _cache_store(key, entry=None, encoding=None, encoded=None):
+    """
+    Cache a new ``entry`` (body, headers, variants) under ``key``, or add
+    the ``encoded`` variant to the entry there, then drop the least
+    recently used entries until both limits hold. Call with the lock held.
+    """
+    global _response_cache_bytes
+    if entry is not None:
+        if key in _response_cache or len(entry[0]) > RESPONSE_CACHE_BYTES:
+            return
+        _response_cache[key] = entry
+        _response_cache_bytes += len(entry[0])
+    else:
+        cached = _response_cache.get(key)
+        if cached is None or encoding in cached[2]:
+            return
+        cached[2][encoding] = encoded
+        _response_cache_bytes += len(encoded)
+    while (len(_response_cache) > RESPONSE_CACHE_SIZE
+           or _response_cache_bytes > RESPONSE_CACHE_BYTES):
+        body, _, variants = _response_cache.popitem(last=False)[1]
+        _response_cache_bytes -= len(body) + sum(map(len, variants.values()))
+
+def project_response(projectId, build):
+    """
+    Respond with ``build()``'s (data, headers) or error(), versioned by
+    the project.
+
+    The strong ETag is derived from the project version and the request
+    path, so an unchanged project answers If-None-Match with 304 without
+    touching its rows, and repeated polls reuse the serialized body and
+    each compressed encoding of it.
+    """
+    version = project_version(projectId)
+    path = request.full_path
+    etag = f"{ETAG_EPOCH}.{version}.{zlib.crc32(path.encode('utf-8')):08x}"
+
+    # Compressed representations carry the encoding in their ETag.
+    for tag in [etag] + [f"{etag}-{name}" for name in compress.CODECS]:
+        if tag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(tag)
+            response.headers["Cache-Control"] = "no-cache"
+            response.vary.add("Accept-Encoding")
+            return response
+
+    key = (path, projectId, version)
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _response_cache.move_to_end(key)
+
+    if cached is None:
+        with reading():
+            # The version may have moved on since; the body is then newer
+            # than its key, which only costs an extra 200 later.
+            result = build()
+            if isinstance(result[0], Response):
+                return result  # an error() response; never cached
+            data, headers = result
+            if not (STREAM_ROWS and len(data) > STREAM_ROWS):
+                # (body, headers, {encoding: compressed body})
+                cached = (fastjson.dumps_bytes(data), headers, {})
+
+        if cached is None:
+            # Too large to hold encoded: stream it, encoding each chunk
+            # under the read lock since rows are updated in place.
+            # compress_response() compresses the stream as it goes.
+            response = Response(fastjson.stream_array(data, guard=reading),
+                                mimetype="application/json", headers=headers)
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        if RESPONSE_CACHE_SIZE and RESPONSE_CACHE_BYTES:
+            with _response_cache_lock:
+                _cache_store(key, cached)
+
+    body, headers, variants = cached
+    encoding = None
+    if len(body) >= compress.COMPRESS_MIN_BYTES:
+        encoding = compress.negotiate(request.accept_encodings)
+    if encoding is not None:
+        encoded = variants.get(encoding)
+        if encoded is None:
+            encoded = compress.compress(body, encoding)
+            with _response_cache_lock:
+                _cache_store(key, encoding=encoding, encoded=encoded)
+        response = Response(encoded, mimetype="application/json", headers=headers)
+        response.headers["Content-Encoding"] = encoding
+        response.set_etag(f"{etag}-{encoding}")
+    else:
+        response = Response(body, mimetype="application/json", headers=headers)
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
 def is_leader(projectId, userId):
-    pm = find("project_members", projectId=projectId, userId=userId)
-    return pm and pm[0]["role"] == "leader"
+    return member_role(projectId, userId) == "leader"
+
+# --------------------------------------------------------------
+# METRICS + PROFILING
+# --------------------------------------------------------------
+
+metrics.registry.gauge(
+    "milestack_collection_rows", "Rows stored per collection.", ("collection",),
+    lambda: [((name,), len(coll)) for name, coll in db.items()])
+metrics.registry.gauge(
+    "milestack_response_cache_entries", "Serialized list responses cached.", (),
+    lambda: [((), len(_response_cache))])
+metrics.registry.gauge(
+    "milestack_response_cache_bytes", "Bytes of cached list responses.", (),
+    lambda: [((), _response_cache_bytes)])
+metrics.registry.gauge(
+    "milestack_event_streams", "Open Server-Sent Events streams.", (),
+    lambda: [((), events.bus.streams)])
+
+@app.before_request
+def start_request_timer():
+    if metrics.METRICS_ENABLED or metrics.profiler.enabled:
+        g.request_started = time.perf_counter()
+        g.request_profile = metrics.profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+    if metrics.METRICS_ENABLED:
+        metrics.request_seconds.observe(elapsed, request.method, route, str(response.status_code))
+        if not response.is_streamed and response.content_length is not None:
+            metrics.response_bytes.observe(response.content_length, request.method, route)
+
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        path = metrics.profiler.finish(profile, elapsed, request.method, route)
+        if path:
+            app.logger.info("slow request %s %s (%.0f ms) profiled to %s",
+                            request.method, request.path, elapsed * 1000, path)
+    return response
+
+@app.teardown_request
+def stop_request_profile(_exc):
+    # Requests that failed before after_request still stop their profiler.
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        profile.disable()
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    if not metrics.METRICS_ENABLED:
+        return error("metrics disabled", 404)
+    if metrics.METRICS_TOKEN:
+        if request.headers.get("Authorization", "") != f"Bearer {metrics.METRICS_TOKEN}":
+            return error("Not authorized", 401)
+    return Response(metrics.registry.render(),
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --------------------------------------------------------------
+# RESPONSE COMPRESSION
+# --------------------------------------------------------------
+
+# Registered after the metrics hook, so it runs first and response sizes
+# are recorded as sent.
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or not compress.compressible(response.mimetype)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = compress.negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress.compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < compress.COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress.compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+# --------------------------------------------------------------
+# RATE LIMITING
+# --------------------------------------------------------------
+
+# Reverse proxies in front of the app. X-Forwarded-For is trusted for
+# this many hops, so anonymous limits apply to the real client address.
+PROXY_HOPS = int(os.environ.get("MILESTACK_PROXY_HOPS", 0))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+# Authenticated views are limited per user inside jwt_required, once the
+# token has been verified; everything else is limited per address here.
+@app.before_request
+def limit_anonymous():
+    view = app.view_functions.get(request.endpoint)
+    if view is None or getattr(view, "requires_jwt", False):
+        return None
+    wait = ratelimit.check(request.endpoint, request.remote_addr, False)
+    if wait:
+        return ratelimit.too_many_requests(wait)
+    return None
 
 # --------------------------------------------------------------
 # AUTH — SIGNUP / LOGIN  + LOGIN ACTIVITY
@@ -97,10 +491,12 @@ def signup():
         "password_hash": hash_password(password),
         "status": "online"
     }
-    insert("users", user)
+    # Re-checked atomically: another signup may have won while hashing.
+    if not insert_unique("users", user, "email"):
+        return error("email already exists")
 
     # Accept pending invites
-    invites = [i for i in db["invites"] if i["email"] == email]
+    invites = find("invites", email=email)
     for inv in invites:
         add_member(inv["projectId"], user["id"], role="member")
         delete("invites", inv["id"])
@@ -121,15 +517,27 @@ def login():
     email = data.get("email")
     password = data.get("password")
 
+    if not email or not password:
+        return error("invalid credentials", 401)
+
     user = find_one("users", "email", email)
-    if not user or not verify_password(user["password_hash"], password):
+    if not user:
+        return error("invalid credentials", 401)
+
+    ok, new_hash = check_password(user["password_hash"], password)
+    if not ok:
         return error("invalid credentials", 401)
 
-    user["status"] = "online"
+    patch = {"status": "online"}
+    if new_hash:
+        patch["password_hash"] = new_hash
+    update("users", user["id"], patch)
 
     # Log "login" for all projects the user belongs to
-    for pm in find("project_members", userId=user["id"]):
-        log_activity(pm["projectId"], user["id"], "logged in")
+    log_activities_bulk(
+        get_user_projects(user["id"]), user["id"], "logged in",
+        coalesce=LOGIN_COALESCE_SECONDS,
+    )
 
     token = create_jwt({
         "user_id": user["id"],
@@ -139,6 +547,15 @@ def login():
 
     return jsonify({"token": token, "user": user_public(user)})
 
+
+@app.route("/api/auth/logout", methods=["POST"])
+@jwt_required
+def logout():
+    token = request.headers["Authorization"].split(" ", 1)[1].strip()
+    revoke_jwt(token)
+    update("users", request.user["user_id"], {"status": "offline"})
+    return jsonify({"ok": True})
+
 # --------------------------------------------------------------
 # PROJECTS
 # --------------------------------------------------------------
@@ -173,15 +590,145 @@ def create_project():
 @jwt_required
 def get_projects():
     user_id = request.user["user_id"]
+    projects = db["projects"]
     visible = []
 
-    for p in db["projects"]:
-        pm = find("project_members", projectId=p["id"], userId=user_id)
-        if pm:
+    for projectId in get_user_projects(user_id):
+        p = projects.get(projectId)
+        if p:
             visible.append(p)
 
     return jsonify(visible)
 
+# --------------------------------------------------------------
+# ROW BUILDERS + BULK EDITS
+# --------------------------------------------------------------
+
+TASK_REQUIRED = ["title", "priority", "status", "projectId"]
+TASK_EDITABLE = ["title", "description", "priority", "status", "assigneeId"]
+MILESTONE_REQUIRED = ["title", "projectId"]
+MILESTONE_EDITABLE = ["title", "description", "dueDate", "status", "progress"]
+# Fields kept in indexes: each must be a string or null, which is checked
+# before anything is written (see not_key_field).
+TASK_KEY_FIELDS = ["priority", "status", "assigneeId"]
+MILESTONE_KEY_FIELDS = ["status", "dueDate"]
+
+# Operations accepted by one /bulk request.
+BULK_MAX_OPS = int(os.environ.get("MILESTACK_BULK_MAX_OPS", 500))
+
+def new_task(data, task_id, now):
+    return {
+        "id": task_id,
+        "title": data["title"],
+        "description": data.get("description", ""),
+        "priority": data["priority"],
+        "status": data["status"],
+        "assigneeId": data.get("assigneeId"),
+        "projectId": data["projectId"],
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+def new_milestone(data, mile_id, now):
+    return {
+        "id": mile_id,
+        "title": data["title"],
+        "description": data.get("description", ""),
+        "dueDate": data.get("dueDate"),
+        "progress": data.get("progress", 0),
+        "status": data.get("status", "pending"),
+        "projectId": data["projectId"],
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+def not_key_field(item, fields):
+    """The first of ``fields`` set in ``item`` to neither a string nor null."""
+    for f in fields:
+        if item.get(f) is not None and not isinstance(item[f], str):
+            return f
+    return None
+
+def bulk_route(collection, kind, id_prefix, build, required, editable, key_fields):
+    """
+    Apply ``{projectId, create: [...], update: [{id, ...}], delete: [id]}``
+    to one project in a single write: everything is checked first, then
+    applied together, logged as one activity and published as one
+    ``<kind>.bulk`` event.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return error("body must be a JSON object")
+    projectId = data.get("projectId")
+    if not projectId or not isinstance(projectId, str):
+        return error("projectId required")
+
+    user_id = request.user["user_id"]
+    if not member_role(projectId, user_id):
+        return error("Not authorized", 403)
+
+    creates = data.get("create") or []
+    updates = data.get("update") or []
+    deletes = data.get("delete") or []
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        return error("create, update and delete must be lists")
+    total = len(creates) + len(updates) + len(deletes)
+    if not total:
+        return error("no operations")
+    if total > BULK_MAX_OPS:
+        return error(f"at most {BULK_MAX_OPS} operations per request", 413)
+
+    now = now_iso()
+    rows = []
+    for item, obj_id in zip(creates, gen_ids(id_prefix, len(creates))):
+        if not isinstance(item, dict):
+            return error("create entries must be objects")
+        item = {**item, "projectId": projectId}
+        for r in required:
+            if r not in item:
+                return error(f"create: {r} is required")
+        bad = not_key_field(item, key_fields)
+        if bad:
+            return error(f"create: {bad} must be a string or null")
+        rows.append(build(item, obj_id, now))
+
+    patches = []
+    for item in updates:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), str):
+            return error("update entries must be objects with an id")
+        changes = {k: item[k] for k in editable if k in item}
+        bad = not_key_field(changes, key_fields)
+        if bad:
+            return error(f"update: {bad} must be a string or null")
+        changes["updatedAt"] = now
+        patches.append((item["id"], changes))
+
+    if not all(isinstance(obj_id, str) for obj_id in deletes):
+        return error("delete entries must be ids")
+    ids = [obj_id for obj_id, _ in patches] + deletes
+    if len(set(ids)) != len(ids):
+        return error("each id may appear only once")
+
+    with writing():
+        missing = []
+        for obj_id in ids:
+            row = find_one(collection, "id", obj_id)
+            if row is None or row.get("projectId") != projectId:
+                missing.append(obj_id)
+        if missing:
+            return error(f"{kind} not found: {', '.join(missing)}", 404)
+
+        created, updated, deleted = apply_changes(collection, rows, patches, deletes)
+        log_activity(
+            projectId, user_id,
+            f"bulk edited {kind}s: {len(created)} created, "
+            f"{len(updated)} updated, {len(deleted)} deleted",
+        )
+
+    result = {"created": created, "updated": updated, "deleted": deleted}
+    events.publish(projectId, f"{kind}.bulk", result)
+    return jsonify(result)
+
 # --------------------------------------------------------------
 # TASKS + ACTIVITY
 # --------------------------------------------------------------
@@ -194,44 +741,44 @@ def get_tasks():
         return error("projectId required")
 
     user_id = request.user["user_id"]
-    pm = find("project_members", projectId=projectId, userId=user_id)
-
-    if not pm:
+    if not member_role(projectId, user_id):
         return error("Not authorized", 403)
 
-    return jsonify(find("tasks", projectId=projectId))
+    return list_response("tasks", projectId, ("status", "assigneeId", "priority"),
+                         {"updatedAt": True, "priority": True})
 
 
 @app.route("/api/tasks", methods=["POST"])
 @jwt_required
 def create_task_route():
     data = request.get_json() or {}
-    required = ["title", "priority", "status", "projectId"]
-
-    for r in required:
+    for r in TASK_REQUIRED:
         if r not in data:
             return error(f"{r} is required")
+    if not isinstance(data["projectId"], str):
+        return error("projectId must be a string")
+    bad = not_key_field(data, TASK_KEY_FIELDS)
+    if bad:
+        return error(f"{bad} must be a string or null")
 
     user_id = request.user["user_id"]
 
-    task = {
-        "id": gen_id("task"),
-        "title": data["title"],
-        "description": data.get("description", ""),
-        "priority": data["priority"],
-        "status": data["status"],
-        "assigneeId": data.get("assigneeId"),
-        "projectId": data["projectId"],
-        "createdAt": now_iso(),
-        "updatedAt": now_iso(),
-    }
+    task = new_task(data, gen_id("task"), now_iso())
     insert("tasks", task)
 
     log_activity(data["projectId"], user_id, f"created task: {task['title']}")
+    events.publish(data["projectId"], "task.created", task)
 
     return jsonify(task), 201
 
 
+@app.route("/api/tasks/bulk", methods=["POST"])
+@jwt_required
+def bulk_tasks():
+    return bulk_route("tasks", "task", "task", new_task, TASK_REQUIRED, TASK_EDITABLE,
+                      TASK_KEY_FIELDS)
+
+
 @app.route("/api/tasks/<task_id>", methods=["PUT"])
 @jwt_required
 def update_task(task_id):
@@ -243,15 +790,16 @@ def update_task(task_id):
 
     user_id = request.user["user_id"]
 
-    allowed = ["title", "description", "priority", "status", "assigneeId"]
-
-    for k in allowed:
-        if k in patch:
-            task[k] = patch[k]
+    changes = {k: patch[k] for k in TASK_EDITABLE if k in patch}
+    bad = not_key_field(changes, TASK_KEY_FIELDS)
+    if bad:
+        return error(f"{bad} must be a string or null")
+    changes["updatedAt"] = now_iso()
 
-    task["updatedAt"] = now_iso()
+    task = update("tasks", task_id, changes) or task
 
     log_activity(task["projectId"], user_id, f"updated task: {task['title']}")
+    events.publish(task["projectId"], "task.updated", task)
 
     return jsonify(task)
 
@@ -268,6 +816,7 @@ def delete_task(task_id):
     delete("tasks", task_id)
 
     log_activity(task["projectId"], user_id, f"deleted task: {task['title']}")
+    events.publish(task["projectId"], "task.deleted", {"id": task_id})
 
     return jsonify({"ok": True})
 
@@ -282,40 +831,41 @@ def get_milestones():
     if not projectId:
         return error("projectId required")
 
-    return jsonify(find("milestones", projectId=projectId))
+    return list_response("milestones", projectId, ("status",), {"dueDate": False})
 
 
 @app.route("/api/milestones", methods=["POST"])
 @jwt_required
 def create_milestone():
     data = request.get_json() or {}
-    required = ["title", "projectId"]
-
-    for r in required:
+    for r in MILESTONE_REQUIRED:
         if r not in data:
             return error(f"{r} is required")
+    if not isinstance(data["projectId"], str):
+        return error("projectId must be a string")
+    bad = not_key_field(data, MILESTONE_KEY_FIELDS)
+    if bad:
+        return error(f"{bad} must be a string or null")
 
     user_id = request.user["user_id"]
 
-    mile = {
-        "id": gen_id("mile"),
-        "title": data["title"],
-        "description": data.get("description", ""),
-        "dueDate": data.get("dueDate"),
-        "progress": data.get("progress", 0),
-        "status": data.get("status", "pending"),
-        "projectId": data["projectId"],
-        "createdAt": now_iso(),
-        "updatedAt": now_iso(),
-    }
+    mile = new_milestone(data, gen_id("mile"), now_iso())
 
     insert("milestones", mile)
 
     log_activity(data["projectId"], user_id, f"created milestone: {mile['title']}")
+    events.publish(data["projectId"], "milestone.created", mile)
 
     return jsonify(mile), 201
 
 
+@app.route("/api/milestones/bulk", methods=["POST"])
+@jwt_required
+def bulk_milestones():
+    return bulk_route("milestones", "milestone", "mile", new_milestone,
+                      MILESTONE_REQUIRED, MILESTONE_EDITABLE, MILESTONE_KEY_FIELDS)
+
+
 @app.route("/api/milestones/<mile_id>", methods=["PUT"])
 @jwt_required
 def update_milestone(mile_id):
@@ -327,14 +877,16 @@ def update_milestone(mile_id):
 
     user_id = request.user["user_id"]
 
-    allowed = ["title", "description", "dueDate", "status", "progress"]
-    for k in allowed:
-        if k in patch:
-            milestone[k] = patch[k]
+    changes = {k: patch[k] for k in MILESTONE_EDITABLE if k in patch}
+    bad = not_key_field(changes, MILESTONE_KEY_FIELDS)
+    if bad:
+        return error(f"{bad} must be a string or null")
+    changes["updatedAt"] = now_iso()
 
-    milestone["updatedAt"] = now_iso()
+    milestone = update("milestones", mile_id, changes) or milestone
 
     log_activity(milestone["projectId"], user_id, f"updated milestone: {milestone['title']}")
+    events.publish(milestone["projectId"], "milestone.updated", milestone)
 
     return jsonify(milestone)
 
@@ -351,6 +903,7 @@ def delete_milestone(mile_id):
     delete("milestones", mile_id)
 
     log_activity(milestone["projectId"], user_id, f"deleted milestone: {milestone['title']}")
+    events.publish(milestone["projectId"], "milestone.deleted", {"id": mile_id})
 
     return jsonify({"ok": True})
 
@@ -365,7 +918,7 @@ def get_chat_threads():
     if not projectId:
         return error("projectId required")
 
-    return jsonify(get_chat_threads_by_project(projectId))
+    return project_response(projectId, lambda: (get_chat_threads_by_project(projectId), {}))
 
 
 @app.route("/api/chatThreads", methods=["POST"])
@@ -377,12 +930,15 @@ def create_chat_thread_route():
 
     if not title or not projectId:
         return error("title and projectId required")
+    if not isinstance(projectId, str):
+        return error("projectId must be a string")
 
     user_id = request.user["user_id"]
 
     thread = create_chat_thread(title=title, projectId=projectId, creatorId=user_id)
 
     log_activity(projectId, user_id, f"created chat thread: {title}")
+    events.publish(projectId, "thread.created", thread)
 
     return jsonify(thread), 201
 
@@ -397,8 +953,10 @@ def update_chat_thread_route(thread_id):
         return error("thread not found", 404)
 
     user_id = request.user["user_id"]
+    if not member_role(thread["projectId"], user_id):
+        return error("Not authorized", 403)
 
-    # Append message
+    # Append message (kept for older clients; see POST .../messages)
     if "message" in data:
         msg = data["message"]
         text = (msg.get("text") or "").strip()
@@ -406,37 +964,78 @@ def update_chat_thread_route(thread_id):
         if not text:
             return error("message.text required")
 
-        msg_obj = {
-            "id": gen_id("msg"),
-            "text": text,
-            "senderId": msg.get("senderId", user_id),
-            "timestamp": now_iso()
-        }
-
-        messages = list(thread.get("messages", []))
-        messages.append(msg_obj)
-
-        updated = update_chat_thread(thread_id, {
-            "messages": messages,
-            "updatedAt": now_iso()
-        })
+        # The sender is always the caller; a client-sent senderId is ignored.
+        new_msg = append_chat_message(thread_id, text, user_id)
 
         log_activity(thread["projectId"], user_id, f"sent a message in thread: {thread['title']}")
+        events.publish(thread["projectId"], "message.created", new_msg)
 
-        return jsonify(updated)
+        return jsonify(find_one("chat_threads", "id", thread_id) or thread)
 
     # Patch thread
-    allowed = ["title", "messages"]
+    allowed = ["title"]
     patch = {k: data[k] for k in allowed if k in data}
 
     if patch:
         patch["updatedAt"] = now_iso()
         updated = update_chat_thread(thread_id, patch)
+        events.publish(thread["projectId"], "thread.updated", updated)
         return jsonify(updated)
 
     return jsonify(thread)
 
 
+@app.route("/api/chatThreads/<thread_id>/messages", methods=["GET"])
+@jwt_required
+def get_chat_messages_route(thread_id):
+    thread = find_one("chat_threads", "id", thread_id)
+
+    if not thread:
+        return error("thread not found", 404)
+
+    user_id = request.user["user_id"]
+    if not member_role(thread["projectId"], user_id):
+        return error("Not authorized", 403)
+
+    limit = page_limit(MESSAGE_PAGE_DEFAULT, MESSAGE_PAGE_MAX)
+    if limit is None:
+        return error("limit must be a positive integer")
+
+    msgs = get_chat_messages(thread_id, limit=limit + 1, before=request.args.get("before"))
+    if msgs is None:
+        return error("unknown cursor")
+
+    response = jsonify(msgs[-limit:])
+    if len(msgs) > limit:
+        response.headers["X-Next-Cursor"] = msgs[-limit]["id"]
+    return response
+
+
+@app.route("/api/chatThreads/<thread_id>/messages", methods=["POST"])
+@jwt_required
+def post_chat_message_route(thread_id):
+    data = request.get_json() or {}
+    thread = find_one("chat_threads", "id", thread_id)
+
+    if not thread:
+        return error("thread not found", 404)
+
+    user_id = request.user["user_id"]
+    if not member_role(thread["projectId"], user_id):
+        return error("Not authorized", 403)
+
+    text = (data.get("text") or "").strip()
+    if not text:
+        return error("text required")
+
+    msg = append_chat_message(thread_id, text, user_id)
+
+    log_activity(thread["projectId"], user_id, f"sent a message in thread: {thread['title']}")
+    events.publish(thread["projectId"], "message.created", msg)
+
+    return jsonify(msg), 201
+
+
 @app.route("/api/chatThreads/<thread_id>", methods=["DELETE"])
 @jwt_required
 def delete_chat_thread_route(thread_id):
@@ -449,6 +1048,7 @@ def delete_chat_thread_route(thread_id):
     delete_chat_thread(thread_id)
 
     log_activity(thread["projectId"], user_id, f"deleted chat thread: {thread['title']}")
+    events.publish(thread["projectId"], "thread.deleted", {"id": thread_id})
 
     return jsonify({"ok": True})
 
@@ -463,24 +1063,7 @@ def get_teammates():
     if not projectId:
         return error("projectId required")
 
-    pm_list = find("project_members", projectId=projectId)
-
-    members = []
-    for pm in pm_list:
-        u = find_one("users", "id", pm["userId"])
-        if u:
-            members.append({
-                "id": u["id"],
-                "name": u["name"],
-                "email": u["email"],
-                "status": u.get("status", "offline"),
-                "role": pm["role"]
-            })
-
-    # Sort: leader first
-    members.sort(key=lambda x: 0 if x["role"] == "leader" else 1)
-
-    return jsonify(members)
+    return jsonify(get_project_members(projectId))
 
 
 @app.route("/api/invites", methods=["GET"])
@@ -488,11 +1071,8 @@ def get_teammates():
 def list_invites():
     projectId = request.args.get("projectId")
     if projectId:
-        return jsonify([
-            i for i in db["invites"]
-            if i["projectId"] == projectId and i["status"] == "pending"
-        ])
-    return jsonify(db["invites"])
+        return jsonify(find("invites", projectId=projectId, status="pending"))
+    return jsonify(find("invites"))
 
 # --------------------------------------------------------------
 # ACTIVITIES ENDPOINT (MAIN FEED FOR FRONTEND)
@@ -507,12 +1087,156 @@ def get_activities_route():
         return error("projectId required")
 
     user_id = request.user["user_id"]
-    pm = find("project_members", projectId=projectId, userId=user_id)
+    if not member_role(projectId, user_id):
+        return error("Not authorized", 403)
+
+    limit = page_limit(ACTIVITY_PAGE_DEFAULT, ACTIVITY_PAGE_MAX)
+    if limit is None:
+        return error("limit must be a positive integer")
+
+    def build():
+        acts = get_project_activities(
+            projectId, limit=limit + 1, before=request.args.get("before")
+        )
+        if acts is None:
+            return error("unknown cursor")
+
+        headers = {}
+        if len(acts) > limit:
+            headers["X-Next-Cursor"] = acts[limit - 1]["id"]
+        return acts[:limit], headers
+
+    return project_response(projectId, build)
+
+# --------------------------------------------------------------
+# SEARCH
+# --------------------------------------------------------------
+
+@app.route("/api/search", methods=["GET"])
+@jwt_required
+def search_route():
+    projectId = request.args.get("projectId")
+    q = (request.args.get("q") or "").strip()
+
+    if not projectId or not q:
+        return error("projectId and q required")
+
+    user_id = request.user["user_id"]
+    if not member_role(projectId, user_id):
+        return error("Not authorized", 403)
+
+    limit = page_limit(SEARCH_PAGE_DEFAULT, SEARCH_PAGE_MAX)
+    if limit is None:
+        return error("limit must be a positive integer")
+
+    collections = None
+    if request.args.get("types"):
+        collections = set(request.args["types"].split(","))
+        unknown = collections - set(SEARCH_FIELDS)
+        if unknown:
+            return error(f"unknown types: {', '.join(sorted(unknown))}")
+
+    return jsonify(search_project(projectId, q, limit=limit, collections=collections))
+
+# --------------------------------------------------------------
+# PROJECT SUMMARY
+# --------------------------------------------------------------
 
-    if not pm:
+@app.route("/api/projects/<projectId>/summary", methods=["GET"])
+@jwt_required
+def get_project_summary(projectId):
+    user_id = request.user["user_id"]
+    if not member_role(projectId, user_id):
+        return error("Not authorized", 403)
+
+    return project_response(projectId, lambda: (project_summary(projectId), {}))
+
+# --------------------------------------------------------------
+# DELTA SYNC
+# --------------------------------------------------------------
+
+@app.route("/api/projects/<projectId>/changes", methods=["GET"])
+@jwt_required
+def project_changes(projectId):
+    user_id = request.user["user_id"]
+    if not member_role(projectId, user_id):
+        return error("Not authorized", 403)
+
+    try:
+        since = int(request.args.get("since", ""))
+    except ValueError:
+        return error("since must be an integer version")
+
+    version, changes = changes_since(projectId, since)
+    if changes is None:
+        return jsonify({"version": version, "resync": True, "changes": []})
+    return jsonify({"version": version, "resync": False, "changes": changes})
+
+# --------------------------------------------------------------
+# PROJECT EVENTS (SERVER-SENT EVENTS)
+# --------------------------------------------------------------
+
+SSE_HEARTBEAT_SECONDS = 15
+# WSGI environ key through which asgi.py takes over event streams.
+ASGI_EVENTS_KEY = "milestack.events"
+
+@app.route("/api/projects/<projectId>/events/ticket", methods=["POST"])
+@jwt_required
+def project_events_ticket(projectId):
+    # EventSource cannot send the bearer token, which would otherwise end
+    # up in access logs as ?token=; it passes this one-use ticket instead.
+    if not member_role(projectId, request.user["user_id"]):
+        return error("Not authorized", 403)
+    path = f"/api/projects/{projectId}/events"
+    return jsonify({"ticket": create_stream_ticket(request.user, path)})
+
+@app.route("/api/projects/<projectId>/events", methods=["GET"])
+@jwt_required(allow_ticket=True)
+def project_events(projectId):
+    user_id = request.user["user_id"]
+    if not member_role(projectId, user_id):
         return error("Not authorized", 403)
 
-    return jsonify(get_project_activities(projectId))
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    try:
+        sub, backlog = events.bus.subscribe(projectId, last_event_id=last_id)
+    except events.TooManyStreams:
+        return error("too many event streams", 503)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if ASGI_EVENTS_KEY in request.environ:
+        # Served by asgi.py: the event loop streams the subscription
+        # instead of a thread blocking in stream() below.
+        request.environ[ASGI_EVENTS_KEY] = (sub, backlog)
+        return Response(mimetype="text/event-stream", headers=headers)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if backlog is None:
+                # History no longer covers the gap, or the id came from
+                # another worker or process: client must reload.
+                yield "event: resync\ndata: {}\n\n"
+            else:
+                for event in backlog:
+                    yield events.format_event(event)
+
+            while True:
+                batch = sub.get(SSE_HEARTBEAT_SECONDS)
+                for event in batch:
+                    yield events.format_event(event)
+                if sub.closed:
+                    break
+                if not batch:
+                    yield ": keep-alive\n\n"
+        finally:
+            sub.close()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers=headers,
+    )
 
 # --------------------------------------------------------------
 # ROOT
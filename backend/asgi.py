@@ -0,0 +1,312 @@
+# asgi.py
+"""
+Async serving mode: the Flask app behind an ASGI adapter.
+
+    python asgi.py --port 5000 --workers 4      # uvicorn when installed
+    uvicorn asgi:app --workers 4                # or any ASGI server
+
+Routes, auth and the store are the same as under WSGI. The event loop
+owns the connections; views run on a bounded thread pool, so CPU-heavy
+work (password hashing, which goes on to auth.hash_pool, and encoding
+large responses, which is pulled chunk by chunk) never blocks the loop.
+Live event streams are the exception: once the view has authorized and
+subscribed, the loop itself streams the subscription, so idle streams
+hold no thread at all.
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import events
+import models
+from app import ASGI_EVENTS_KEY, SSE_HEARTBEAT_SECONDS, app as flask_app
+
+try:
+    import uvicorn
+except ImportError:  # optional dependency
+    uvicorn = None
+
+# Threads running views per worker process.
+ASGI_THREADS = int(os.environ.get("MILESTACK_ASGI_THREADS", 32))
+# Worker processes started by main(); more than one needs MILESTACK_STORAGE=sqlite.
+ASGI_WORKERS = int(os.environ.get("MILESTACK_ASGI_WORKERS", 1))
+# On shutdown, connections still open after this many seconds (live event
+# streams never finish on their own) are cancelled.
+ASGI_SHUTDOWN_SECONDS = float(os.environ.get("MILESTACK_ASGI_SHUTDOWN_SECONDS", 5))
+# Larger request bodies are refused with 413 before reaching a view.
+ASGI_MAX_BODY_BYTES = int(os.environ.get("MILESTACK_ASGI_MAX_BODY_BYTES", 16 * 1024 * 1024))
+
+
+def build_environ(scope, body: bytes) -> dict:
+    """The WSGI environ for an ASGI http ``scope`` and its request body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        ASGI_EVENTS_KEY: None,
+    }
+    client = scope.get("client")
+    if client:
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = client[0], str(client[1])
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+def _call_view(wsgi_app, environ):
+    """
+    Run the WSGI app on a pool thread. Returns (status, headers, chunks,
+    iterator, result): ``chunks`` is what was read of the body, ``iterator``
+    the unread rest, or None when the body is complete and ``result`` has
+    been closed.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = wsgi_app(environ, start_response)
+    status, headers = started
+    length = next((int(v) for k, v in headers if k.lower() == "content-length"), None)
+
+    # Read sized bodies here, in one hop; unsized (streamed) ones are
+    # pulled one chunk per hop by the caller.
+    chunks = []
+    it = iter(result)
+    if length is not None:
+        received = 0
+        for chunk in it:
+            chunks.append(chunk)
+            received += len(chunk)
+            if received >= length:
+                break
+        _close(result)
+        it = None
+    return int(status.split(" ", 1)[0]), headers, chunks, it, result
+
+
+def _next_chunk(it):
+    return next(it, None)
+
+
+def _close(result):
+    close = getattr(result, "close", None)
+    if close is not None:
+        close()
+
+
+class AsgiApp:
+    """ASGI application serving a WSGI app; see the module docstring."""
+
+    def __init__(self, wsgi_app, threads: int = ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max(threads, 1), thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        else:
+            raise RuntimeError(f"unsupported ASGI scope type {scope['type']!r}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive):
+        """
+        The request body, or None when the client left. Reading stops once
+        the body is over ASGI_MAX_BODY_BYTES.
+        """
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if len(body) > ASGI_MAX_BODY_BYTES or not message.get("more_body", False):
+                return bytes(body)
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        if len(body) > ASGI_MAX_BODY_BYTES:
+            await _send_plain(send, 413, b"request body too large")
+            return
+
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, body)
+        status, headers, chunks, it, result = await loop.run_in_executor(
+            self.executor, _call_view, self.wsgi_app, environ)
+
+        subscription = environ[ASGI_EVENTS_KEY]
+        if subscription is not None:
+            _close(result)
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            await _start(send, status, headers)
+            await stream_events(subscription, receive, send)
+            return
+
+        await _start(send, status, headers)
+        if it is None:
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
+            return
+        try:
+            for chunk in chunks:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            while it is not None:
+                chunk = await loop.run_in_executor(self.executor, _next_chunk, it)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            await loop.run_in_executor(self.executor, _close, result)
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _start(send, status: int, headers):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    })
+
+
+async def _send_plain(send, status: int, body: bytes):
+    await _start(send, status, [("Content-Type", "text/plain"),
+                                ("Content-Length", str(len(body)))])
+    await send({"type": "http.response.body", "body": body})
+
+
+async def stream_events(subscription, receive, send):
+    """
+    Stream an events.Subscription on the event loop: what app.project_events
+    streams from a thread under WSGI, woken by Subscription.waker instead.
+    """
+    sub, backlog = subscription
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def waker():
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    sub.waker = waker
+    disconnected = loop.create_task(_wait_disconnect(receive))
+
+    async def write(text: str):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"),
+                    "more_body": True})
+
+    try:
+        if backlog is None:
+            # History no longer covers the gap, or the id came from
+            # another worker or process: client must reload.
+            await write("retry: 3000\n\nevent: resync\ndata: {}\n\n")
+        else:
+            await write("retry: 3000\n\n" + "".join(events.format_event(e) for e in backlog))
+
+        while not disconnected.done():
+            wake.clear()
+            batch = sub.get(0)
+            if batch:
+                await write("".join(events.format_event(e) for e in batch))
+            if sub.closed:
+                break
+            if batch:
+                continue
+            woken = loop.create_task(wake.wait())
+            done, _ = await asyncio.wait({woken, disconnected}, timeout=SSE_HEARTBEAT_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if not done:
+                await write(": keep-alive\n\n")
+        if not disconnected.done():
+            await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        disconnected.cancel()
+        sub.waker = None
+        sub.close()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+app = AsgiApp(flask_app)
+
+
+# ------------------------------------------------------
+# Entry point
+# ------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Milestack API over ASGI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=ASGI_WORKERS)
+    parser.add_argument("--threads", type=int, default=ASGI_THREADS,
+                        help="view threads per worker (MILESTACK_ASGI_THREADS)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and models.sql is None:
+        # Each process would get its own in-memory store.
+        parser.error("--workers > 1 needs MILESTACK_STORAGE=sqlite")
+    if uvicorn is None:
+        sys.exit("asgi.py needs an ASGI server: pip install uvicorn "
+                 "(or run any ASGI server on asgi:app)")
+
+    os.environ["MILESTACK_ASGI_THREADS"] = str(args.threads)
+    if args.workers > 1:
+        # Workers import the app themselves.
+        uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers,
+                    lifespan="on", timeout_graceful_shutdown=ASGI_SHUTDOWN_SECONDS)
+    else:
+        app.executor.shutdown()
+        app.executor = ThreadPoolExecutor(max(args.threads, 1), thread_name_prefix="asgi")
+        uvicorn.run(app, host=args.host, port=args.port, lifespan="on",
+                    timeout_graceful_shutdown=ASGI_SHUTDOWN_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,241 @@
 # auth.py
+import hashlib
+import multiprocessing
 import os
+import secrets
+import threading
+import time
 import jwt
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 from flask import request, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 
+import metrics
+import ratelimit
+
 JWT_SECRET = os.environ.get("MILESTACK_JWT_SECRET", "change_this_secret_in_prod")
 JWT_ALGORITHM = "HS256"
 JWT_EXP_DELTA_HOURS = int(os.environ.get("MILESTACK_JWT_EXP_HOURS", 24))
 
+# Werkzeug hash method for new passwords; older hashes are upgraded on login.
+PASSWORD_HASH_METHOD = os.environ.get("MILESTACK_PASSWORD_HASH", "scrypt:32768:8:1")
+# Processes hashing passwords (0 hashes inline in the request thread).
+HASH_WORKERS = int(os.environ.get("MILESTACK_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hash jobs running or queued before new ones are refused with 503.
+HASH_QUEUE = int(os.environ.get("MILESTACK_HASH_QUEUE", 64))
+
+# Seconds a stream ticket (see create_stream_ticket) stays redeemable.
+STREAM_TICKET_SECONDS = float(os.environ.get("MILESTACK_STREAM_TICKET_SECONDS", 60))
+STREAM_TICKET_AUDIENCE = "stream"
+
+# Verified tokens remembered per worker (0 disables the cache).
+TOKEN_CACHE_SIZE = int(os.environ.get("MILESTACK_TOKEN_CACHE_SIZE", 10000))
+# Seconds a verified token is trusted without re-verification (capped at exp).
+TOKEN_CACHE_TTL = float(os.environ.get("MILESTACK_TOKEN_CACHE_TTL", 300))
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified token digest -> claims.
+
+    Entries expire after ``ttl`` seconds and never outlive the token's own
+    ``exp``. Raw tokens are never stored, only their SHA-256 digest.
+    Revoked digests are remembered until their token expires, and users
+    can be revoked wholesale: tokens issued before the revocation are
+    rejected even once they have fallen out of the cache. Revocations are
+    per process unless ``shared`` is set (see sqlstore.SqliteRevocations),
+    in which case they are also recorded there and checked on every lookup.
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # digest -> (claims, expires_at)
+        self._by_user = {}              # user_id -> {digest}
+        self._revoked = {}              # digest -> token exp
+        self._revoked_users = {}        # user_id -> revoked before (epoch seconds)
+        self.shared = None
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key: bytes, claims: dict):
+        if not self.size:
+            return
+        expires_at = min(time.time() + self.ttl, claims.get("exp", 0))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (claims, expires_at)
+            user_id = claims.get("user_id")
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.size:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: bytes):
+        claims, _ = self._entries.pop(key)
+        keys = self._by_user.get(claims.get("user_id"))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[claims.get("user_id")]
+
+    def is_revoked(self, key: bytes, claims: dict) -> bool:
+        with self._lock:
+            if key in self._revoked:
+                return True
+            cutoff = self._revoked_users.get(claims.get("user_id"))
+            if cutoff is not None and claims.get("iat", 0) < cutoff:
+                return True
+        shared = self.shared
+        return shared is not None and shared.is_revoked(
+            key, claims.get("user_id"), claims.get("iat", 0))
+
+    def revoke(self, key: bytes, exp: float) -> bool:
+        """Revoke ``key``; False if it had been revoked already."""
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            first = key not in self._revoked
+            self._revoked[key] = exp
+            # Revocations of tokens that have expired anyway are not needed.
+            for k in [k for k, e in self._revoked.items() if e <= now]:
+                del self._revoked[k]
+        if self.shared is not None:
+            first = self.shared.revoke(key, exp, now) and first
+        return first
+
+    def revoke_user(self, user_id: str):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+            now = time.time()
+            self._revoked_users[user_id] = now
+            # Every token issued before this long ago has expired anyway.
+            horizon = now - JWT_EXP_DELTA_HOURS * 3600
+            for u in [u for u, t in self._revoked_users.items() if t <= horizon]:
+                del self._revoked_users[u]
+        if self.shared is not None:
+            self.shared.revoke_user(user_id, now, horizon)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revoked": len(self._revoked),
+            }
+
+
+token_cache = TokenCache()
+
+class HashPoolBusy(Exception):
+    pass
+
+
+class HashPool:
+    """
+    Password hashing on a small process pool, so slow key derivation never
+    occupies request threads for long. At most ``queue`` jobs may be running
+    or waiting; beyond that submit() raises HashPoolBusy instead of queuing.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue: int = HASH_QUEUE):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(queue, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server can copy locks held by other
+                # threads into the child; start workers from a forkserver.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"))
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            if not self.workers:
+                return fn(*args)
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+hash_pool = HashPool()
+
+
+def _check_and_rehash(hash_: str, plain: str, method: str):
+    # Runs in a pool worker: one round trip verifies and, if needed, upgrades.
+    if not check_password_hash(hash_, plain):
+        return False, None
+    if hash_.split("$", 1)[0] == method:
+        return True, None
+    return True, generate_password_hash(plain, method=method)
+
 def hash_password(plain: str) -> str:
-    return generate_password_hash(plain)
+    """Raises HashPoolBusy when the hashing queue is full."""
+    return hash_pool.run(generate_password_hash, plain, PASSWORD_HASH_METHOD)
+
+def check_password(hash_: str, plain: str):
+    """
+    Returns (ok, new_hash). ``new_hash`` is set when the password matched
+    but was stored with other hash parameters than PASSWORD_HASH_METHOD.
+    Raises HashPoolBusy when the hashing queue is full.
+    """
+    return hash_pool.run(_check_and_rehash, hash_, plain, PASSWORD_HASH_METHOD)
 
 def verify_password(hash_: str, plain: str) -> bool:
-    return check_password_hash(hash_, plain)
+    return check_password(hash_, plain)[0]
 
 def create_jwt(payload: dict) -> str:
-    exp = datetime.now(tz=timezone.utc) + timedelta(hours=JWT_EXP_DELTA_HOURS)
+    now = datetime.now(tz=timezone.utc)
+    exp = now + timedelta(hours=JWT_EXP_DELTA_HOURS)
     payload_copy = payload.copy()
-    payload_copy.update({"exp": exp})
+    payload_copy.update({"exp": exp, "iat": now.timestamp()})
     token = jwt.encode(payload_copy, JWT_SECRET, algorithm=JWT_ALGORITHM)
     # PyJWT returns str for <=v2.0, bytes for older; ensure str
     if isinstance(token, bytes):
@@ -35,18 +251,103 @@ def decode_jwt(token: str):
     except jwt.InvalidTokenError:
         return {"error": "invalid_token"}
 
-def jwt_required(fn):
+def verify_jwt(token: str):
+    """
+    decode_jwt() behind the verified-token cache. Cached claims are served
+    without re-checking the signature until their cache entry expires.
+    """
+    key = token_digest(token)
+    claims = token_cache.get(key)
+    if claims is None:
+        started = time.perf_counter()
+        claims = decode_jwt(token)
+        if metrics.METRICS_ENABLED:
+            metrics.jwt_decode_seconds.observe(time.perf_counter() - started)
+            metrics.token_cache_lookups.inc("miss")
+        if claims.get("error"):
+            return claims
+        token_cache.put(key, claims)
+    elif metrics.METRICS_ENABLED:
+        metrics.token_cache_lookups.inc("hit")
+    if token_cache.is_revoked(key, claims):
+        return {"error": "token_revoked"}
+    return claims
+
+def revoke_jwt(token: str):
+    """Invalidate one token (logout), even if it is currently cached."""
+    claims = decode_jwt(token)
+    if claims.get("error"):
+        return
+    token_cache.revoke(token_digest(token), claims["exp"])
+
+def create_stream_ticket(claims: dict, path: str) -> str:
+    """
+    A short-lived, single-use credential for one GET of ``path``, for
+    clients such as EventSource that cannot set headers. Unlike a bearer
+    token it is harmless once it shows up in an access log.
+    """
+    now = datetime.now(tz=timezone.utc)
+    payload = {key: claims.get(key) for key in ("user_id", "email", "name")}
+    payload.update({
+        "aud": STREAM_TICKET_AUDIENCE,
+        "path": path,
+        "jti": secrets.token_hex(8),
+        "iat": now.timestamp(),
+        "exp": now + timedelta(seconds=STREAM_TICKET_SECONDS),
+    })
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def redeem_stream_ticket(ticket: str, path: str):
+    """Claims of an unused ticket for ``path``, spending it, or {"error": ...}."""
+    try:
+        claims = jwt.decode(ticket, JWT_SECRET, algorithms=[JWT_ALGORITHM],
+                            audience=STREAM_TICKET_AUDIENCE)
+    except jwt.ExpiredSignatureError:
+        return {"error": "ticket_expired"}
+    except jwt.InvalidTokenError:
+        return {"error": "invalid_ticket"}
+    if claims.get("path") != path:
+        return {"error": "invalid_ticket"}
+    key = token_digest(ticket)
+    if token_cache.is_revoked(key, claims) or not token_cache.revoke(key, claims["exp"]):
+        return {"error": "ticket_used"}
+    return claims
+
+def revoke_user_tokens(user_id: str):
+    """Invalidate every token issued to a user so far (password change)."""
+    token_cache.revoke_user(user_id)
+
+def jwt_required(fn=None, *, allow_ticket=False):
+    """
+    Require a valid bearer token. ``allow_ticket`` also accepts a stream
+    ticket for this path as ?ticket= (see create_stream_ticket).
+    """
+    if fn is None:
+        return lambda f: jwt_required(f, allow_ticket=allow_ticket)
+
     @wraps(fn)
     def wrapper(*args, **kwargs):
         auth = request.headers.get("Authorization", "")
-        if not auth.startswith("Bearer "):
-            return jsonify({"error": "Authorization header missing or malformed"}), 401
-        token = auth.split(" ", 1)[1].strip()
-        decoded = decode_jwt(token)
+        if auth.startswith("Bearer "):
+            decoded = verify_jwt(auth.split(" ", 1)[1].strip())
+        elif allow_ticket and request.args.get("ticket"):
+            decoded = redeem_stream_ticket(request.args["ticket"], request.path)
+        else:
+            decoded = {"error": "Authorization header missing or malformed"}
         if isinstance(decoded, dict) and decoded.get("error"):
+            # limit_anonymous skips this view, so failed attempts are
+            # limited here, per client address like anonymous requests.
+            wait = ratelimit.check(request.endpoint, request.remote_addr, False)
+            if wait:
+                return ratelimit.too_many_requests(wait)
             return jsonify({"error": decoded["error"]}), 401
         # Attach user info into Flask global 'g' via current_app (we'll return it)
         # decoded should include 'user_id' and 'email' (see login/signup)
         request.user = decoded
+        wait = ratelimit.check(request.endpoint, decoded["user_id"], True)
+        if wait:
+            return ratelimit.too_many_requests(wait)
         return fn(*args, **kwargs)
+    # Anonymous rate limits skip these views; see app.limit_anonymous.
+    wrapper.requires_jwt = True
     return wrapper
@@ -0,0 +1,70 @@
+# benchmarks/bench_bulk.py
+"""
+Board reorganisation cost: one PUT per card versus one bulk request.
+
+    python benchmarks/bench_bulk.py --cards 200 --rounds 20
+
+Creates a project's cards through the Flask test client, then moves all
+of them between columns repeatedly, once card by card and once in
+batches, and reports the time per moved card and the activities logged.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+
+from app import BULK_MAX_OPS, app  # noqa: E402
+from models import find  # noqa: E402
+
+STATUSES = ("todo", "in-progress", "done")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    token = client.post("/api/auth/signup", json={
+        "name": "Bench", "email": "bench@example.com", "password": "pw",
+    }).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    pid = client.post("/api/projects", headers=headers, json={"title": "Board"}).get_json()["id"]
+
+    created = client.post("/api/tasks/bulk", headers=headers, json={
+        "projectId": pid,
+        "create": [{"title": f"Card {i}", "priority": "medium", "status": "todo"}
+                   for i in range(args.cards)],
+    }).get_json()["created"]
+    ids = [t["id"] for t in created]
+
+    def per_card(status):
+        for task_id in ids:
+            client.put(f"/api/tasks/{task_id}", headers=headers, json={"status": status})
+
+    def bulk(status):
+        for i in range(0, len(ids), BULK_MAX_OPS):
+            client.post("/api/tasks/bulk", headers=headers, json={
+                "projectId": pid,
+                "update": [{"id": task_id, "status": status}
+                           for task_id in ids[i:i + BULK_MAX_OPS]],
+            })
+
+    print(f"{'mode':<10} {'us/card':>9} {'activities':>11}")
+    for name, move in (("per card", per_card), ("bulk", bulk)):
+        before = len(find("activities", projectId=pid))
+        start = time.perf_counter()
+        for r in range(args.rounds):
+            move(STATUSES[(r + 1) % len(STATUSES)])
+        took = time.perf_counter() - start
+        logged = len(find("activities", projectId=pid)) - before
+        print(f"{name:<10} {took / (args.rounds * len(ids)) * 1e6:>9.1f} {logged:>11}")
+
+
+if __name__ == "__main__":
+    main()
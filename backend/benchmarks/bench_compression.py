@@ -0,0 +1,74 @@
+# benchmarks/bench_compression.py
+"""
+Response compression: ratio and cost per codec, and what reusing the
+compressed bodies of cached responses saves.
+
+    python benchmarks/bench_compression.py --tasks 2000 --requests 500
+
+Encodes one project's task list with every available codec, then polls
+GET /api/tasks through the Flask test client with the response cache
+on and off, accepting gzip.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+os.environ.setdefault("MILESTACK_STREAM_ROWS", "0")
+
+import app as app_module  # noqa: E402
+import compress  # noqa: E402
+import fastjson  # noqa: E402
+from models import find  # noqa: E402
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    client = app_module.app.test_client()
+    token = client.post("/api/auth/signup", json={
+        "name": "Bench", "email": "bench@example.com", "password": "pw",
+    }).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    pid = client.post("/api/projects", headers=headers, json={"title": "P"}).get_json()["id"]
+    for i in range(0, args.tasks, app_module.BULK_MAX_OPS):
+        client.post("/api/tasks/bulk", headers=headers, json={
+            "projectId": pid,
+            "create": [{"title": f"Task {j}", "description": "Write the release notes",
+                        "priority": "medium", "status": "todo"}
+                       for j in range(i, min(args.tasks, i + app_module.BULK_MAX_OPS))],
+        })
+
+    body = fastjson.dumps_bytes(find("tasks", projectId=pid))
+    print(f"payload {len(body) / 1024:.0f} KiB ({args.tasks} tasks)\n")
+    print(f"{'codec':<6} {'ratio':>7} {'compress ms':>12}")
+    for name in compress.CODECS:
+        out = compress.compress(body, name)
+        ms = timed(lambda: compress.compress(body, name), 20)
+        print(f"{name:<6} {len(body) / len(out):>7.1f} {ms:>12.2f}")
+
+    print(f"\n{'response cache':<16} {'ms/request':>11}")
+    url = f"/api/tasks?projectId={pid}"
+    gz = {**headers, "Accept-Encoding": "gzip"}
+    for size in (1024, 0):
+        app_module.RESPONSE_CACHE_SIZE = size
+        app_module._response_cache.clear()
+        ms = timed(lambda: client.get(url, headers=gz), args.requests)
+        print(f"{'on' if size else 'off':<16} {ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
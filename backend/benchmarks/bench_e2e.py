@@ -0,0 +1,280 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark: a realistic request mix against a seeded store.
+
+    python benchmarks/bench_e2e.py --projects 2000 --users 10000 --requests 20000 \\
+        --json after.json --compare before.json
+
+Seeds the store with benchmarks/dataset.py, then drives the real routes
+through the Flask test client: logins, board loads (projects, tasks and
+milestones, revalidated with If-None-Match like the frontend does), task
+creates and updates, chat reads and posts, activity polling, search and
+project summaries. Each simulated request picks a random member of a
+random project. Reports overall throughput, p50/p99 latency and errors
+per route, and peak memory. --json writes the results for later runs to
+--compare against.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+# A cheap hash keeps logins from drowning out every other route; set
+# MILESTACK_PASSWORD_HASH to measure the production method instead.
+os.environ.setdefault("MILESTACK_PASSWORD_HASH", "pbkdf2:sha256:1000")
+
+import dataset  # noqa: E402
+import models  # noqa: E402
+from app import app  # noqa: E402
+from auth import create_jwt  # noqa: E402
+
+# Relative weight of each action in the mix.
+MIX = {
+    "login": 2,
+    "board": 15,
+    "task_update": 20,
+    "task_create": 5,
+    "chat_read": 10,
+    "chat_post": 10,
+    "activity_poll": 25,
+    "search": 5,
+    "summary": 8,
+}
+
+
+def parse_mix(spec: str) -> dict:
+    mix = dict(MIX)
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in MIX:
+            raise SystemExit(f"unknown action {name!r}; choose from {', '.join(MIX)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(ordered, pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Session:
+    """One simulated client: its test client, caches and latency samples."""
+
+    def __init__(self, data: dict, seed: int):
+        self.data = data
+        self.rng = random.Random(seed)
+        self.client = app.test_client()
+        self.projects = list(data["members"])
+        self.etags = {}
+        self.samples = {}   # route -> [seconds]
+        self.errors = {}    # route -> count
+        self.record = True
+
+    def headers(self, user_id: str):
+        token = self.data["tokens"].get(user_id)
+        if token is None:
+            token = self.data["tokens"][user_id] = create_jwt({
+                "user_id": user_id, "email": self.data["emails"][user_id], "name": user_id})
+        return {"Authorization": f"Bearer {token}"}
+
+    def call(self, route: str, method: str, url: str, revalidate: bool = False, **kwargs):
+        if revalidate and url in self.etags:
+            kwargs.setdefault("headers", {})["If-None-Match"] = self.etags[url]
+        t0 = time.perf_counter()
+        resp = self.client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - t0
+        if revalidate and resp.headers.get("ETag"):
+            self.etags[url] = resp.headers["ETag"]
+        if self.record:
+            self.samples.setdefault(route, []).append(elapsed)
+            if resp.status_code >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return resp
+
+    def run(self, action: str):
+        rng = self.rng
+        pid = rng.choice(self.projects)
+        user_id = rng.choice(self.data["members"][pid])
+        headers = self.headers(user_id)
+
+        if action == "login":
+            self.call("POST /api/auth/login", "POST", "/api/auth/login", json={
+                "email": self.data["emails"][user_id], "password": dataset.PASSWORD})
+        elif action == "board":
+            self.call("GET /api/projects", "GET", "/api/projects", headers=headers)
+            for kind in ("tasks", "milestones"):
+                self.call(f"GET /api/{kind}", "GET", f"/api/{kind}?projectId={pid}",
+                          revalidate=True, headers=dict(headers))
+        elif action == "task_update":
+            task_id = rng.choice(self.data["tasks"][pid])
+            self.call("PUT /api/tasks/<id>", "PUT", f"/api/tasks/{task_id}", headers=headers,
+                      json={"status": rng.choice(dataset.TASK_STATUSES)})
+        elif action == "task_create":
+            resp = self.call("POST /api/tasks", "POST", "/api/tasks", headers=headers, json={
+                "projectId": pid, "title": dataset._text(rng, 4),
+                "priority": rng.choice(dataset.PRIORITIES), "status": "todo"})
+            if resp.status_code == 201:
+                self.data["tasks"][pid].append(resp.get_json()["id"])
+        elif action == "chat_read":
+            tid = rng.choice(self.data["threads"][pid])
+            self.call("GET /api/chatThreads/<id>/messages", "GET",
+                      f"/api/chatThreads/{tid}/messages?limit=50", headers=headers)
+        elif action == "chat_post":
+            tid = rng.choice(self.data["threads"][pid])
+            self.call("POST /api/chatThreads/<id>/messages", "POST",
+                      f"/api/chatThreads/{tid}/messages", headers=headers,
+                      json={"text": dataset._text(rng, rng.randint(3, 20))})
+        elif action == "activity_poll":
+            self.call("GET /api/activities", "GET", f"/api/activities?projectId={pid}&limit=50",
+                      revalidate=True, headers=dict(headers))
+        elif action == "search":
+            self.call("GET /api/search", "GET",
+                      f"/api/search?projectId={pid}&q={rng.choice(dataset.WORDS)[:4]}",
+                      headers=headers)
+        elif action == "summary":
+            self.call("GET /api/projects/<id>/summary", "GET", f"/api/projects/{pid}/summary",
+                      revalidate=True, headers=dict(headers))
+
+
+def run_mix(data: dict, mix: dict, requests: int, clients: int, warmup: int, seed: int):
+    actions, weights = zip(*((a, w) for a, w in mix.items() if w > 0))
+    sessions = [Session(data, seed + i) for i in range(clients)]
+    per_client = max(1, requests // clients)
+
+    def drive(session: Session, n: int, record: bool):
+        session.record = record
+        picks = session.rng.choices(actions, weights, k=n)
+        for action in picks:
+            session.run(action)
+
+    for session in sessions:
+        drive(session, max(1, warmup // clients), False)
+
+    workers = [threading.Thread(target=drive, args=(s, per_client, True)) for s in sessions]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    samples, errors = {}, {}
+    for session in sessions:
+        for route, s in session.samples.items():
+            samples.setdefault(route, []).extend(s)
+        for route, n in session.errors.items():
+            errors[route] = errors.get(route, 0) + n
+    return samples, errors, elapsed
+
+
+def summarize(samples: dict, errors: dict, elapsed: float) -> dict:
+    routes = {}
+    for route in sorted(samples):
+        ordered = sorted(samples[route])
+        routes[route] = {
+            "count": len(ordered),
+            "errors": errors.get(route, 0),
+            "p50_ms": round(percentile(ordered, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {"requests": total, "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1), "routes": routes}
+
+
+def print_report(result: dict, baseline: dict = None):
+    def delta(new, old):
+        if old in (None, 0):
+            return ""
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    base_routes = (baseline or {}).get("routes", {})
+    print(f"\n{'route':<38} {'count':>7} {'err':>5} {'p50 ms':>16} {'p99 ms':>16}")
+    for route, r in result["routes"].items():
+        b = base_routes.get(route, {})
+        p50 = f"{r['p50_ms']:.2f}{delta(r['p50_ms'], b.get('p50_ms'))}"
+        p99 = f"{r['p99_ms']:.2f}{delta(r['p99_ms'], b.get('p99_ms'))}"
+        print(f"{route:<38} {r['count']:>7} {r['errors']:>5} {p50:>16} {p99:>16}")
+
+    base_rps = (baseline or {}).get("throughput_rps")
+    print(f"\n{result['requests']:,} requests in {result['elapsed_s']:.1f}s: "
+          f"{result['throughput_rps']:,.0f} req/s{delta(result['throughput_rps'], base_rps)}")
+    mem = result["memory"]
+    base_peak = (baseline or {}).get("memory", {}).get("peak_rss_mb")
+    print(f"memory: {mem['after_seed_rss_mb']:.0f} MB after seeding, "
+          f"peak {mem['peak_rss_mb']:.0f} MB{delta(mem['peak_rss_mb'], base_peak)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    dataset.add_scale_args(parser)
+    parser.add_argument("--requests", type=int, default=20_000,
+                        help="actions to run; a board load is three requests")
+    parser.add_argument("--clients", type=int, default=1,
+                        help="concurrent client threads")
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--mix", default="",
+                        help="weights to override, e.g. 'login=0,search=20'")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    scale = dataset.scale_from_args(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    start_rss = rss_mb()
+    t0 = time.perf_counter()
+    data = dataset.generate(scale, args.seed)
+    seed_s = time.perf_counter() - t0
+    data["emails"] = dict(data["users"])
+    data["tokens"] = {}
+    after_seed = rss_mb()
+    rows = sum(data["counts"].values())
+    print(f"seeded {rows:,} rows in {seed_s:.1f}s ({models.STORAGE} storage)")
+
+    samples, errors, elapsed = run_mix(data, mix, args.requests, args.clients,
+                                       args.warmup, args.seed)
+    result = summarize(samples, errors, elapsed)
+    result.update({
+        "config": {"scale": scale, "seed": args.seed, "requests": args.requests,
+                   "clients": args.clients, "warmup": args.warmup, "mix": mix,
+                   "storage": models.STORAGE, "python": platform.python_version()},
+        "dataset": {"counts": data["counts"], "seed_s": round(seed_s, 3)},
+        "memory": {"start_rss_mb": round(start_rss, 1),
+                   "after_seed_rss_mb": round(after_seed, 1),
+                   "peak_rss_mb": round(peak_rss_mb(), 1)},
+    })
+    print_report(result, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_json.py
+"""
+Encoding a large list response: stdlib json, the fast encoder and the
+streamed array.
+
+    python benchmarks/bench_json.py --rows 100000
+
+Each mode runs in its own process over the same generated task records
+and reports total encode time, time to the first byte and the growth of
+peak RSS while encoding.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = ("stdlib", "fast", "stream")
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_mode(mode: str, rows: int):
+    sys.path.insert(0, os.path.join(HERE, ".."))
+    import fastjson
+    from models import RECORD_TYPES, gen_id, now_iso
+    from records import json_default
+
+    Task = RECORD_TYPES["tasks"]
+    data = [Task({
+        "id": gen_id("task"), "title": f"Task number {i}", "description": "x" * 40,
+        "priority": "medium", "status": "todo", "assigneeId": f"user-{i % 50:08x}",
+        "projectId": "proj-00000001", "createdAt": now_iso(), "updatedAt": now_iso(),
+    }) for i in range(rows)]
+
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    first = None
+    size = 0
+    if mode == "stdlib":
+        body = json.dumps(data, separators=(",", ":"), default=json_default).encode("utf-8")
+        first = time.perf_counter()
+        size = len(body)
+    elif mode == "fast":
+        body = fastjson.dumps_bytes(data)
+        first = time.perf_counter()
+        size = len(body)
+    else:
+        for chunk in fastjson.stream_array(data):
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    end = time.perf_counter()
+
+    print(json.dumps({
+        "encoder": "orjson" if fastjson.USE_ORJSON else "stdlib",
+        "total_ms": (end - start) * 1000,
+        "first_byte_ms": (first - start) * 1000,
+        "rss_growth_mb": peak_rss_mb() - before,
+        "bytes": size,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.rows)
+        return
+
+    print(f"{'mode':<8} {'encoder':<8} {'total ms':>9} {'first byte ms':>14} "
+          f"{'peak RSS +MB':>13} {'MB':>6}")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, "--rows", str(args.rows), "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<8} {r['encoder']:<8} {r['total_ms']:>9.1f} {r['first_byte_ms']:>14.2f} "
+              f"{r['rss_growth_mb']:>13.1f} {r['bytes'] / 1e6:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
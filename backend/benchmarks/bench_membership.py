@@ -0,0 +1,105 @@
+# benchmarks/bench_membership.py
+"""
+GET /api/projects and membership-check latency at scale.
+
+    python benchmarks/bench_membership.py --projects 10000 --members 100000
+
+Fills the in-memory db with --projects projects and --members memberships,
+then times the route through the Flask test client alongside the old
+scan-every-project lookup it replaced.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.pop("MILESTACK_DATA_DIR", None)
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+
+import models  # noqa: E402
+from app import app  # noqa: E402
+from auth import create_jwt  # noqa: E402
+
+
+def populate(projects: int, members: int, users: int):
+    for i in range(users):
+        models.insert("users", {
+            "id": f"user-{i:06d}", "name": f"User {i}",
+            "email": f"user{i}@example.com", "password_hash": "",
+        })
+    for i in range(projects):
+        models.insert("projects", {
+            "id": f"proj-{i:06d}", "title": f"Project {i}", "description": "",
+            "status": "running", "members": [],
+        })
+
+    rng = random.Random(7)
+    added = 0
+    while added < members:
+        projectId = f"proj-{rng.randrange(projects):06d}"
+        userId = f"user-{rng.randrange(users):06d}"
+        if models.member_role(projectId, userId):
+            continue
+        models.add_member(projectId, userId, "leader" if added % 10 == 0 else "member")
+        added += 1
+
+
+def scan_projects(userId: str):
+    # The lookup GET /api/projects used before the membership index.
+    return [
+        p for p in models.db["projects"]
+        if models.find("project_members", projectId=p["id"], userId=userId)
+    ]
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def report(label: str, result):
+    p50, p99 = result
+    print(f"{label:<28} p50 {p50 * 1000:8.3f} ms   p99 {p99 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--projects", type=int, default=10_000)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    populate(args.projects, args.members, args.users)
+    print(f"populated {args.projects} projects, {args.members} members "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(11)
+    users = [f"user-{rng.randrange(args.users):06d}" for _ in range(args.requests)]
+    client = app.test_client()
+    headers = {u: {"Authorization": "Bearer " + create_jwt({"user_id": u})}
+               for u in set(users)}
+
+    def request(userId):
+        resp = client.get("/api/projects", headers=headers[userId])
+        assert resp.status_code == 200
+
+    def check(userId):
+        models.member_role(f"proj-{rng.randrange(args.projects):06d}", userId)
+
+    report("GET /api/projects:", timed(request, [(u,) for u in users]))
+    report("member_role():", timed(check, [(u,) for u in users]))
+    report("old project scan:", timed(scan_projects, [(u,) for u in users[:20]]))
+
+
+if __name__ == "__main__":
+    main()
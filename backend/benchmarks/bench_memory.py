@@ -0,0 +1,65 @@
+# benchmarks/bench_memory.py
+"""
+Heap bytes per stored row: plain dicts versus the slotted record types.
+
+    python benchmarks/bench_memory.py --rows 200000
+
+Builds each collection twice with the same generated rows, once with the
+engine storing dicts and once with its record type, and measures the
+memory traced while it is filled (rows, indexes and feeds included).
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import COLLECTION_TYPES, INDEXES, RECORD_TYPES, Collection, gen_id, now_iso  # noqa: E402
+
+
+def make_row(name: str, i: int) -> dict:
+    # Fresh strings per row, as rows decoded from request bodies have.
+    project = f"proj-{i % 200:08x}"
+    user = f"user-{i % 5000:08x}"
+    if name == "activities":
+        return {"id": gen_id("act"), "projectId": project, "userId": user,
+                "description": "logged in", "timestamp": now_iso()}
+    if name == "tasks":
+        return {"id": gen_id("task"), "title": f"Task {i}", "description": "",
+                "priority": "medium", "status": "todo", "assigneeId": user,
+                "projectId": project, "createdAt": now_iso(), "updatedAt": now_iso()}
+    if name == "project_members":
+        return {"id": gen_id("pm"), "projectId": project, "userId": f"user-{i:08x}",
+                "role": "member"}
+    raise ValueError(name)
+
+
+def measure(name: str, rows: int, record_type) -> float:
+    gc.collect()
+    tracemalloc.start()
+    coll = COLLECTION_TYPES.get(name, Collection)(name, INDEXES[name], record_type)
+    for i in range(rows):
+        coll.add(make_row(name, i))
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del coll
+    return used / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'collection':<16} {'dict':>10} {'record':>10}   saved")
+    for name in ("activities", "tasks", "project_members"):
+        before = measure(name, args.rows, None)
+        after = measure(name, args.rows, RECORD_TYPES[name])
+        print(f"{name:<16} {before:>8.0f} B {after:>8.0f} B   {1 - after / before:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_queries.py
+"""
+Sorted, filtered task pages: ordered indexes versus filtering and sorting
+the project's rows per request.
+
+    python benchmarks/bench_queries.py --tasks 50000 --pages 500
+
+Fills one project through the engine and times first pages and deep
+keyset pages for a few filter and sort combinations.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import (  # noqa: E402
+    INDEXES, ORDERED_INDEXES, PRIORITY_RANK, RECORD_TYPES, Collection, gen_id, now_iso,
+    sort_key,
+)
+
+STATUSES = ("todo", "in-progress", "done")
+PRIORITIES = tuple(PRIORITY_RANK)
+
+QUERIES = {
+    "all by updatedAt": ("updatedAt", {}),
+    "status by updatedAt": ("updatedAt", {"status": "todo"}),
+    "assignee by priority": ("priority", {"assigneeId": "user-00000007"}),
+    "status+priority filter": ("updatedAt", {"status": "done", "priority": "high"}),
+}
+
+
+def fill(tasks: int, seed: int) -> Collection:
+    rng = random.Random(seed)
+    coll = Collection("tasks", INDEXES["tasks"], RECORD_TYPES["tasks"], ORDERED_INDEXES["tasks"])
+    for i in range(tasks):
+        coll.add({
+            "id": gen_id("task"), "title": f"Task {i}", "description": "",
+            "priority": rng.choice(PRIORITIES), "status": rng.choice(STATUSES),
+            "assigneeId": f"user-{rng.randrange(50):08x}", "projectId": "proj-1",
+            "createdAt": now_iso(), "updatedAt": now_iso(),
+        })
+    return coll
+
+
+def scan_page(coll: Collection, sort: str, equals: dict, limit: int):
+    ranks = PRIORITY_RANK if sort == "priority" else None
+    rows = [r for r in coll.candidates({"projectId": "proj-1"})
+            if all(r.get(f) == v for f, v in equals.items())]
+    rows.sort(key=lambda r: (sort_key(r.get(sort), ranks), r["id"]), reverse=True)
+    return rows[:limit]
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50_000)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    coll = fill(args.tasks, args.seed)
+    print(f"{'query':<24} {'scan us':>10} {'index us':>10} {'page 20 us':>11}")
+    for name, (sort, filters) in QUERIES.items():
+        equals = {"projectId": "proj-1", **filters}
+        ranks = PRIORITY_RANK if sort == "priority" else None
+
+        def first():
+            return coll.ordered(sort, equals, desc=True, limit=args.limit, ranks=ranks)
+
+        # Cursor of the 20th page, to time deep keyset pages.
+        cursor = None
+        for _ in range(19):
+            _, cursor = coll.ordered(sort, equals, desc=True, after=cursor,
+                                     limit=args.limit, ranks=ranks)
+            if cursor is None:
+                break
+
+        scan = timed(lambda: scan_page(coll, sort, filters, args.limit), max(1, args.pages // 50))
+        index = timed(first, args.pages)
+        deep = timed(lambda: coll.ordered(sort, equals, desc=True, after=cursor,
+                                          limit=args.limit, ranks=ranks), args.pages)
+        print(f"{name:<24} {scan:>10.0f} {index:>10.0f} {deep:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/bench_ratelimit.py
+"""
+Overhead of rate limiting on the hot authenticated path.
+
+    python benchmarks/bench_ratelimit.py --requests 20000 --keys 100000
+
+Times TokenBucketLimiter.take() on its own over --keys distinct clients,
+then GET /api/tasks through the Flask test client with rate limiting on
+and off (limits set high enough that nothing is refused).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+os.environ.pop("MILESTACK_DATA_DIR", None)
+os.environ["MILESTACK_RATE_LIMIT_USER"] = "1000000000/1"
+
+import ratelimit  # noqa: E402
+from app import app  # noqa: E402
+
+
+def time_requests(client, url, headers, n: int):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client.get(url, headers=headers)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    limiter = ratelimit.TokenBucketLimiter("bench", 1_000_000, 1.0)
+    keys = [f"user-{i:08x}" for i in range(args.keys)]
+    for key in keys:
+        limiter.take(key)
+    start = time.perf_counter()
+    for key in keys:
+        limiter.take(key)
+    took = time.perf_counter() - start
+    print(f"take(): {took / args.keys * 1e9:,.0f} ns/call over {len(limiter):,} buckets")
+
+    client = app.test_client()
+    token = client.post("/api/auth/signup", json={
+        "name": "Bench", "email": "bench@example.com", "password": "pw",
+    }).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    pid = client.post("/api/projects", headers=headers, json={"title": "P"}).get_json()["id"]
+    for i in range(20):
+        client.post("/api/tasks", headers=headers, json={
+            "projectId": pid, "title": f"t{i}", "priority": "low", "status": "todo"})
+    url = f"/api/tasks?projectId={pid}"
+
+    # Alternate modes so drift affects both alike.
+    results = {True: [], False: []}
+    per_round = max(1, args.requests // args.rounds)
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            ratelimit.RATE_LIMIT_ENABLED = enabled
+            results[enabled] += time_requests(client, url, headers, per_round)
+
+    print(f"\n{'GET /api/tasks':<16} {'p50 us':>9} {'mean us':>9}")
+    for enabled, label in ((False, "limits off"), (True, "limits on")):
+        samples = results[enabled]
+        print(f"{label:<16} {statistics.median(samples):>9.1f} {statistics.mean(samples):>9.1f}")
+    delta = statistics.median(results[True]) - statistics.median(results[False])
+    print(f"overhead: {delta:+.1f} us per request (p50)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_search.py
+"""
+Indexing throughput and query latency of the in-process search index.
+
+    python benchmarks/bench_search.py --docs 1000000 --projects 50
+
+Indexes synthetic chat messages spread over a number of projects, then
+times single-word, prefix and multi-word queries against one project and
+reports p50/p99 latency per query kind.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from search import SearchIndex  # noqa: E402
+
+WORDS = [f"w{i:05d}" for i in range(20_000)]
+COMMON = ["deploy", "release", "bug", "login", "review", "design", "build",
+          "test", "merge", "sprint", "deadline", "meeting", "client", "api"]
+
+
+def make_text(rng: random.Random) -> str:
+    words = rng.choices(COMMON, k=2) + rng.choices(WORDS, k=rng.randint(4, 12))
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    projects = [f"proj-{i:08x}" for i in range(args.projects)]
+    index = SearchIndex()
+
+    start = time.perf_counter()
+    for i in range(args.docs):
+        index.index("chat_messages", f"msg-{i:08x}", projects[i % len(projects)],
+                    make_text(rng))
+    took = time.perf_counter() - start
+    print(f"indexed {args.docs} docs in {took:.1f}s ({args.docs / took:,.0f} docs/s)")
+
+    project = projects[0]
+    kinds = {
+        "word": lambda: rng.choice(COMMON),
+        "rare word": lambda: rng.choice(WORDS),
+        "prefix": lambda: rng.choice(COMMON)[:3],
+        "wide prefix": lambda: "w0",
+        "two words": lambda: " ".join(rng.sample(COMMON, 2)),
+        "word + prefix": lambda: f"{rng.choice(COMMON)} {rng.choice(WORDS)[:4]}",
+    }
+
+    print(f"\n{'query':<14} {'p50 ms':>9} {'p99 ms':>9} {'hits':>6}")
+    for name, make in kinds.items():
+        samples = []
+        hits = []
+        for _ in range(args.queries):
+            q = make()
+            t0 = time.perf_counter()
+            found = index.query(project, q, args.limit)
+            samples.append((time.perf_counter() - t0) * 1000)
+            hits.append(len(found))
+        print(f"{name:<14} {percentile(samples, 0.5):>9.3f} {percentile(samples, 0.99):>9.3f}"
+              f" {statistics.mean(hits):>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
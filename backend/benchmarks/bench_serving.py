@@ -0,0 +1,262 @@
+# benchmarks/bench_serving.py
+"""
+Compare the threaded WSGI server with the ASGI mode under 1k open streams.
+
+    python benchmarks/bench_serving.py --connections 1000 --requests 3000
+
+Each mode serves the app in its own process: "wsgi" is werkzeug's threaded
+server (what app.run uses), "asgi" is ``python asgi.py`` (needs uvicorn).
+The benchmark opens ``--connections`` live event streams to one project
+and keeps them open while ``--concurrency`` keep-alive clients fetch the
+task list. It reports the time to open the streams, list latency and
+throughput under that load, how long one event takes to reach every
+stream, and the server's resident memory and thread count.
+"""
+import argparse
+import asyncio
+import http.client
+import importlib.util
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, "..")
+
+WSGI_SERVER = (
+    "import sys; from werkzeug.serving import run_simple; from app import app; "
+    "run_simple('127.0.0.1', int(sys.argv[1]), app, threaded=True)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+def start_server(mode: str, port: int, connections: int, workdir: str):
+    env = dict(os.environ,
+               PYTHONPATH=BACKEND,
+               MILESTACK_SSE_MAX_STREAMS=str(connections + 100),
+               MILESTACK_HASH_WORKERS="0",
+               MILESTACK_RATE_LIMIT="0")
+    if mode == "wsgi":
+        cmd = [sys.executable, "-c", WSGI_SERVER, str(port)]
+    else:
+        cmd = [sys.executable, os.path.join(BACKEND, "asgi.py"), "--port", str(port)]
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def request(port: int, method: str, path: str, body=None, token=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers=headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    conn.close()
+    return json.loads(data)
+
+
+def proc_status(pid: int) -> dict:
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "Threads"):
+                status[key] = int(value.split()[0])
+    return status
+
+
+class Streams:
+    """Live event streams held open on an asyncio loop in a background thread."""
+
+    def __init__(self, port: int, path: str, token: str, count: int):
+        self.port = port
+        self.path = path
+        self.token = token
+        self.count = count
+        self.marker = None
+        self.seen = {}  # stream -> when the marker first arrived
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def open(self, concurrency: int = 100) -> float:
+        """Open every stream; returns the seconds taken."""
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(self._open_all(concurrency), self.loop)
+        self.writers = future.result()
+        return time.perf_counter() - start
+
+    async def _open_all(self, concurrency: int):
+        gate = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(self._open(gate) for _ in range(self.count)))
+
+    async def _open(self, gate):
+        async with gate:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port, limit=2 ** 20)
+            writer.write(f"GET {self.path} HTTP/1.1\r\nHost: bench\r\n"
+                         f"Authorization: Bearer {self.token}\r\n"
+                         f"Accept: text/event-stream\r\n\r\n".encode())
+            while b"retry:" not in await reader.readline():
+                pass
+        self.loop.create_task(self._drain(reader))
+        return writer
+
+    async def _drain(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if self.marker and self.marker.encode() in line:
+                self.seen.setdefault(id(reader), time.perf_counter())
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._close_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    async def _close_all(self):
+        for writer in self.writers:
+            writer.close()
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_mode(mode: str, args) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = start_server(mode, port, args.connections, workdir)
+        try:
+            token = request(port, "POST", "/api/auth/signup", {
+                "name": "Bench", "email": "bench@example.com", "password": "pw"})["token"]
+            pid = request(port, "POST", "/api/projects", {"title": "Bench"}, token)["id"]
+            for i in range(args.tasks):
+                request(port, "POST", "/api/tasks", {
+                    "projectId": pid, "title": f"task {i}", "priority": "medium",
+                    "status": "todo"}, token)
+            idle = proc_status(proc.pid)
+
+            streams = Streams(port, f"/api/projects/{pid}/events", token, args.connections)
+            open_s = streams.open()
+            loaded = proc_status(proc.pid)
+
+            latencies = []
+            lock = threading.Lock()
+
+            def client(n: int):
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                headers = {"Authorization": f"Bearer {token}"}
+                mine = []
+                for _ in range(n):
+                    t0 = time.perf_counter()
+                    conn.request("GET", f"/api/tasks?projectId={pid}", headers=headers)
+                    conn.getresponse().read()
+                    mine.append(time.perf_counter() - t0)
+                conn.close()
+                with lock:
+                    latencies.extend(mine)
+
+            per_client = max(1, args.requests // args.concurrency)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                list(pool.map(client, [per_client] * args.concurrency))
+            elapsed = time.perf_counter() - start
+
+            # One write, fanned out to every open stream.
+            streams.marker = "fan-out marker"
+            t0 = time.perf_counter()
+            request(port, "POST", "/api/tasks", {
+                "projectId": pid, "title": streams.marker, "priority": "low",
+                "status": "todo"}, token)
+            deadline = time.time() + 30
+            while len(streams.seen) < args.connections and time.time() < deadline:
+                time.sleep(0.01)
+            fanout = (max(streams.seen.values()) - t0) if len(streams.seen) == args.connections else None
+            streams.close()
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "connections": args.connections,
+        "open_streams_s": round(open_s, 3),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "fanout_ms": round(fanout * 1000, 1) if fanout is not None else None,
+        "rss_idle_mb": round(idle["VmRSS"] / 1024, 1),
+        "rss_loaded_mb": round(loaded["VmRSS"] / 1024, 1),
+        "threads_loaded": loaded["Threads"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    raise_fd_limit(2 * args.connections + 1024)
+    results = []
+    for mode in args.modes.split(","):
+        if mode == "asgi" and importlib.util.find_spec("uvicorn") is None:
+            print("skipping asgi: pip install uvicorn", file=sys.stderr)
+            continue
+        results.append(run_mode(mode, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<6} {'open s':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'fan-out ms':>11} {'RSS MB':>7} {'threads':>8}")
+    for r in results:
+        fanout = f"{r['fanout_ms']:.1f}" if r["fanout_ms"] is not None else "timeout"
+        print(f"{r['mode']:<6} {r['open_streams_s']:>7.2f} {r['throughput_rps']:>8.0f}"
+              f" {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {fanout:>11}"
+              f" {r['rss_loaded_mb']:>7.1f} {r['threads_loaded']:>8}")
+
+
+if __name__ == "__main__":
+    main()
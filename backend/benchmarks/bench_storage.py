@@ -0,0 +1,105 @@
+# benchmarks/bench_storage.py
+"""
+Compare the memory and SQLite storage backends under one request mix.
+
+    python benchmarks/bench_storage.py --requests 5000
+
+Each backend runs in its own process (storage is chosen at import time)
+and replays the same seeded mix of task writes, chat messages and list
+reads through the Flask test client.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_mix(requests: int, projects: int):
+    sys.path.insert(0, os.path.join(HERE, ".."))
+    from app import app
+
+    client = app.test_client()
+    resp = client.post("/api/auth/signup", json={
+        "name": "Bench", "email": "bench@example.com", "password": "pw",
+    })
+    headers = {"Authorization": f"Bearer {resp.get_json()['token']}"}
+
+    rng = random.Random(3)
+    project_ids, threads, tasks = [], {}, {}
+    for i in range(projects):
+        pid = client.post("/api/projects", headers=headers,
+                          json={"title": f"P{i}"}).get_json()["id"]
+        project_ids.append(pid)
+        tasks[pid] = []
+        threads[pid] = client.post("/api/chatThreads", headers=headers,
+                                   json={"title": "t", "projectId": pid}).get_json()["id"]
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        pid = rng.choice(project_ids)
+        op = rng.random()
+        t0 = time.perf_counter()
+        if op < 0.3 or not tasks[pid]:
+            task = client.post("/api/tasks", headers=headers, json={
+                "title": "task", "priority": "low", "status": "todo", "projectId": pid,
+            }).get_json()
+            tasks[pid].append(task["id"])
+        elif op < 0.5:
+            client.put(f"/api/tasks/{rng.choice(tasks[pid])}", headers=headers,
+                       json={"status": "done"})
+        elif op < 0.6:
+            client.post(f"/api/chatThreads/{threads[pid]}/messages", headers=headers,
+                        json={"text": "hello"})
+        else:
+            path = rng.choice(["/api/tasks", "/api/activities", "/api/teammates"])
+            client.get(f"{path}?projectId={pid}", headers=headers)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{os.environ['MILESTACK_STORAGE']:<8} {requests / elapsed:>8,.0f} req/s   "
+          f"p50 {statistics.median(samples) * 1000:.3f} ms   p99 {p99 * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        run_mix(args.requests, args.projects)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="milestack-bench-")
+    try:
+        for backend in ("memory", "sqlite"):
+            env = dict(
+                os.environ,
+                MILESTACK_STORAGE=backend,
+                MILESTACK_SQLITE_PATH=os.path.join(tmp, "bench.db"),
+                MILESTACK_HASH_WORKERS="0",
+                MILESTACK_RATE_LIMIT="0",
+            )
+            env.pop("MILESTACK_DATA_DIR", None)
+            subprocess.run(
+                [sys.executable, __file__, "--backend", backend,
+                 "--requests", str(args.requests), "--projects", str(args.projects)],
+                env=env, check=True,
+            )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_summary.py
+"""
+Project summary cost: incrementally maintained counters versus counting
+the project's rows on every request.
+
+    python benchmarks/bench_summary.py --tasks 50000 --reads 2000
+
+Fills one project with tasks and milestones through the engine, then
+times summaries read from the counters and recounted from the rows, and
+the extra cost the counters add to task updates.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import INDEXES, RECORD_TYPES, Collection, ProjectSummaries, gen_id, now_iso  # noqa: E402
+
+STATUSES = ("todo", "in-progress", "done")
+PRIORITIES = ("low", "medium", "high")
+
+
+def fill(summaries_cache: bool, tasks: int, seed: int):
+    rng = random.Random(seed)
+    task_coll = Collection("tasks", INDEXES["tasks"], RECORD_TYPES.get("tasks"))
+    mile_coll = Collection("milestones", INDEXES["milestones"], RECORD_TYPES.get("milestones"))
+    summaries = ProjectSummaries(task_coll, mile_coll, cache=summaries_cache)
+    for i in range(tasks):
+        task_coll.add({
+            "id": gen_id("task"), "title": f"Task {i}", "description": "",
+            "priority": rng.choice(PRIORITIES), "status": rng.choice(STATUSES),
+            "assigneeId": f"user-{rng.randrange(50):08x}", "projectId": "proj-1",
+            "createdAt": now_iso(), "updatedAt": now_iso(),
+        })
+    for i in range(max(1, tasks // 100)):
+        mile_coll.add({
+            "id": gen_id("mile"), "title": f"M{i}", "description": "",
+            "dueDate": None, "progress": rng.randrange(101), "status": "pending",
+            "projectId": "proj-1", "createdAt": now_iso(), "updatedAt": now_iso(),
+        })
+    return task_coll, summaries
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50_000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    results = {}
+    for cache in (True, False):
+        tasks, summaries = fill(cache, args.tasks, args.seed)
+        reads = args.reads if cache else max(1, args.reads // 100)
+        read_us = timed(lambda: summaries.get("proj-1"), reads)
+
+        rng = random.Random(args.seed)
+        ids = [row["id"] for row in tasks]
+
+        def move():
+            tasks.patch(tasks.get(rng.choice(ids)), {"status": rng.choice(STATUSES)})
+
+        results[cache] = (read_us, timed(move, args.updates))
+
+    print(f"{'':<10} {'summary us':>12} {'update us':>10}")
+    for cache, label in ((True, "counters"), (False, "recount")):
+        read_us, update_us = results[cache]
+        print(f"{label:<10} {read_us:>12.1f} {update_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# benchmarks/dataset.py
+"""
+Synthetic dataset generator.
+
+    python benchmarks/dataset.py --users 10000 --projects 2000
+
+Fills the configured store (memory, MILESTACK_DATA_DIR or SQLite) with
+users, projects, memberships, tasks, milestones, chat threads and
+messages, and activities. Rows go in through models.insert_many, so
+indexes, watchers and the journal see them exactly as if the API had
+written them. Every user's password is PASSWORD. Ids are sequential and
+all randomness comes from --seed, so the same options always produce
+the same dataset.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import models  # noqa: E402
+from auth import hash_password  # noqa: E402
+
+PASSWORD = "bench-password"
+BATCH = 10_000
+
+WORDS = ["deploy", "release", "bug", "login", "review", "design", "build", "test",
+         "merge", "sprint", "deadline", "meeting", "client", "api", "docs", "cache",
+         "search", "billing", "mobile", "report", "onboarding", "metrics", "export"]
+PRIORITIES = ["low", "medium", "high"]
+TASK_STATUSES = ["todo", "in-progress", "done"]
+MILESTONE_STATUSES = ["pending", "in-progress", "completed"]
+
+SCALE_DEFAULTS = {
+    "users": 1000,
+    "projects": 200,
+    "members": 8,       # per project, leader included
+    "tasks": 50,        # per project
+    "milestones": 5,    # per project
+    "threads": 3,       # per project
+    "messages": 40,     # per thread
+    "activities": 100,  # per project
+}
+
+
+def add_scale_args(parser: argparse.ArgumentParser):
+    for name, default in SCALE_DEFAULTS.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def scale_from_args(args) -> dict:
+    return {name: getattr(args, name) for name in SCALE_DEFAULTS}
+
+
+class _Clock:
+    """Increasing ISO timestamps over the past ``days``."""
+
+    def __init__(self, rows: int, days: int = 90):
+        self.t = datetime.now(timezone.utc) - timedelta(days=days)
+        self.step = timedelta(days=days) / max(rows, 1)
+
+    def __call__(self) -> str:
+        self.t += self.step
+        return self.t.isoformat(timespec="microseconds")
+
+
+def _ids(prefix: str, n: int):
+    return [f"{prefix}-{i:08x}" for i in range(n)]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def _insert(collection: str, rows):
+    for start in range(0, len(rows), BATCH):
+        models.insert_many(collection, rows[start:start + BATCH])
+
+
+def generate(scale: dict, seed: int = 1) -> dict:
+    """
+    Seed the store with ``scale`` (see SCALE_DEFAULTS) and return what a
+    request mix needs to address it: ``users`` as (id, email) pairs and
+    per-project ``members``, ``tasks``, ``milestones`` and ``threads``
+    id lists, plus row ``counts``.
+    """
+    rng = random.Random(seed)
+    n_users, n_projects = scale["users"], scale["projects"]
+    members_per = min(max(scale["members"], 1), n_users)
+    total = n_projects * (scale["tasks"] + scale["milestones"] + scale["activities"]
+                          + scale["threads"] * (scale["messages"] + 1))
+    clock = _Clock(total)
+
+    password_hash = hash_password(PASSWORD)
+    user_ids = _ids("user", n_users)
+    users = [{"id": uid, "name": f"User {i}", "email": f"user{i}@example.com",
+              "password_hash": password_hash, "status": "offline"}
+             for i, uid in enumerate(user_ids)]
+    _insert("users", users)
+
+    members, tasks, milestones, threads = {}, {}, {}, {}
+    projects, memberships = [], []
+    for pid in _ids("proj", n_projects):
+        team = rng.sample(user_ids, members_per)
+        members[pid] = team
+        projects.append({"id": pid, "title": f"Project {_text(rng, 2)}",
+                         "description": _text(rng, 8), "status": "running",
+                         "members": [team[0]]})
+        memberships += [{"id": f"pm-{len(memberships) + i:08x}", "projectId": pid,
+                         "userId": uid, "role": "leader" if i == 0 else "member"}
+                        for i, uid in enumerate(team)]
+    _insert("projects", projects)
+    _insert("project_members", memberships)
+
+    task_ids = iter(_ids("task", n_projects * scale["tasks"]))
+    mile_ids = iter(_ids("mile", n_projects * scale["milestones"]))
+    rows = {"tasks": [], "milestones": []}
+    for pid in members:
+        team = members[pid]
+        tasks[pid], milestones[pid] = [], []
+        for _ in range(scale["tasks"]):
+            now = clock()
+            row = {"id": next(task_ids), "title": _text(rng, 4), "description": _text(rng, 12),
+                   "priority": rng.choice(PRIORITIES), "status": rng.choice(TASK_STATUSES),
+                   "assigneeId": rng.choice(team + [None]), "projectId": pid,
+                   "createdAt": now, "updatedAt": now}
+            rows["tasks"].append(row)
+            tasks[pid].append(row["id"])
+        for _ in range(scale["milestones"]):
+            now = clock()
+            due = (datetime.now(timezone.utc) + timedelta(days=rng.randint(-30, 120)))
+            row = {"id": next(mile_ids), "title": _text(rng, 3), "description": _text(rng, 10),
+                   "dueDate": due.date().isoformat(), "progress": rng.randint(0, 100),
+                   "status": rng.choice(MILESTONE_STATUSES), "projectId": pid,
+                   "createdAt": now, "updatedAt": now}
+            rows["milestones"].append(row)
+            milestones[pid].append(row["id"])
+    _insert("tasks", rows["tasks"])
+    _insert("milestones", rows["milestones"])
+
+    thread_ids = iter(_ids("thread", n_projects * scale["threads"]))
+    msg_ids = iter(_ids("msg", n_projects * scale["threads"] * scale["messages"]))
+    thread_rows, messages = [], []
+    for pid in members:
+        team = members[pid]
+        threads[pid] = []
+        for _ in range(scale["threads"]):
+            tid = next(thread_ids)
+            created = clock()
+            msgs = [{"id": next(msg_ids), "threadId": tid, "text": _text(rng, rng.randint(3, 20)),
+                     "senderId": rng.choice(team), "timestamp": clock()}
+                    for _ in range(scale["messages"])]
+            messages += msgs
+            thread_rows.append({
+                "id": tid, "title": _text(rng, 3), "projectId": pid, "creatorId": team[0],
+                "messageCount": len(msgs), "lastMessage": msgs[-1] if msgs else None,
+                "createdAt": created, "updatedAt": msgs[-1]["timestamp"] if msgs else created,
+            })
+            threads[pid].append(tid)
+    _insert("chat_threads", thread_rows)
+    _insert("chat_messages", messages)
+
+    per_project = min(scale["activities"], models.ACTIVITY_RETENTION or scale["activities"])
+    act_ids = iter(_ids("act", n_projects * per_project))
+    activities = [{"id": next(act_ids), "projectId": pid, "userId": rng.choice(members[pid]),
+                   "description": f"updated task: {_text(rng, 3)}", "timestamp": clock()}
+                  for pid in members for _ in range(per_project)]
+    _insert("activities", activities)
+
+    counts = {"users": len(users), "projects": len(projects),
+              "memberships": len(memberships), "tasks": len(rows["tasks"]),
+              "milestones": len(rows["milestones"]), "chat_threads": len(thread_rows),
+              "chat_messages": len(messages), "activities": len(activities)}
+    return {"users": [(u["id"], u["email"]) for u in users], "members": members,
+            "tasks": tasks, "milestones": milestones, "threads": threads, "counts": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_args(parser)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = generate(scale_from_args(args), args.seed)
+    took = time.perf_counter() - start
+    rows = sum(data["counts"].values())
+    print(f"generated {rows:,} rows in {took:.1f}s ({rows / took:,.0f} rows/s)")
+    for name, count in data["counts"].items():
+        print(f"  {name:<14} {count:>10,}")
+
+    if models.store is not None:
+        models.store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# benchmarks/stress_concurrency.py
+"""
+Hammer the API from many threads and check the db invariants afterwards.
+
+    python benchmarks/stress_concurrency.py --threads 32 --ops 300
+
+Threads race on signups with the same emails, membership changes, task
+writes, chat messages and reads through the Flask test client. Exits
+non-zero if any request failed with a 5xx or an invariant is broken.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+os.environ.setdefault("MILESTACK_PASSWORD_HASH", "pbkdf2:sha256:1000")
+
+import models  # noqa: E402
+from app import app  # noqa: E402
+
+
+def signup(client, i):
+    resp = client.post("/api/auth/signup", json={
+        "name": f"User {i}", "email": f"user{i}@example.com", "password": "pw",
+    })
+    if resp.status_code == 201:
+        return resp.get_json()
+    return None
+
+
+def worker(seed, args, shared, failures):
+    try:
+        run_worker(seed, args, shared, failures)
+    except Exception as exc:
+        failures.append(f"thread {seed}: {exc!r}")
+
+
+def run_worker(seed, args, shared, failures):
+    rng = random.Random(seed)
+    client = app.test_client()
+
+    # Several threads race for each email; exactly one may win.
+    me = None
+    while me is None:
+        me = signup(client, rng.randrange(args.users))
+        if me is None:
+            resp = client.post("/api/auth/login", json={
+                "email": f"user{rng.randrange(args.users)}@example.com",
+                "password": "pw",
+            })
+            if resp.status_code == 200:
+                me = resp.get_json()
+    headers = {"Authorization": f"Bearer {me['token']}"}
+    user_id = me["user"]["id"]
+
+    for projectId in shared["projects"]:
+        models.add_member(projectId, user_id)
+
+    for _ in range(args.ops):
+        projectId = rng.choice(shared["projects"])
+        op = rng.random()
+        if op < 0.25:
+            resp = client.post("/api/tasks", headers=headers, json={
+                "title": "t", "priority": "low", "status": "todo",
+                "projectId": projectId,
+            })
+        elif op < 0.35:
+            tasks = models.find("tasks", projectId=projectId)
+            if not tasks:
+                continue
+            resp = client.delete(f"/api/tasks/{rng.choice(tasks)['id']}", headers=headers)
+        elif op < 0.5:
+            tasks = models.find("tasks", projectId=projectId)
+            if not tasks:
+                continue
+            resp = client.put(f"/api/tasks/{rng.choice(tasks)['id']}", headers=headers,
+                              json={"status": rng.choice(["todo", "done"])})
+        elif op < 0.6:
+            resp = client.post(f"/api/chatThreads/{shared['threads'][projectId]}/messages",
+                               headers=headers, json={"text": "hi"})
+        elif op < 0.65:
+            # Duplicate joins must not create duplicate memberships.
+            models.add_member(projectId, user_id)
+            continue
+        else:
+            path = rng.choice(["/api/tasks", "/api/activities", "/api/teammates",
+                               "/api/chatThreads", "/api/projects"])
+            resp = client.get(f"{path}?projectId={projectId}", headers=headers)
+
+        if resp.status_code >= 500:
+            failures.append(f"{resp.status_code} {resp.request.path}")
+
+
+def check_invariants():
+    problems = []
+
+    emails = Counter(u["email"] for u in models.db["users"])
+    problems += [f"duplicate user {e}" for e, n in emails.items() if n > 1]
+
+    pairs = Counter((m["projectId"], m["userId"]) for m in models.db["project_members"])
+    problems += [f"duplicate membership {p}" for p, n in pairs.items() if n > 1]
+
+    members = models.db["project_members"]
+    for m in members:
+        if members.role(m["projectId"], m["userId"]) != m["role"]:
+            problems.append(f"member map out of date for {m['id']}")
+
+    for name in models.INDEXES:
+        coll = models.db[name]
+        # In-memory engine only: every row must sit in each index.
+        for fields, index in getattr(coll, "_indexes", {}).items():
+            indexed = sum(len(bucket) for bucket in index.values())
+            if indexed != len(coll):
+                problems.append(f"{name} index {fields} has {indexed} of {len(coll)} rows")
+
+    for thread in models.db["chat_threads"]:
+        count = models.db["chat_messages"].count(thread["id"])
+        if thread["messageCount"] != count:
+            problems.append(f"thread {thread['id']} says {thread['messageCount']}, has {count}")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=300)
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--users", type=int, default=16,
+                        help="distinct emails the threads compete for")
+    args = parser.parse_args()
+
+    owner = signup(app.test_client(), "owner")
+    headers = {"Authorization": f"Bearer {owner['token']}"}
+    client = app.test_client()
+    shared = {"projects": [], "threads": {}}
+    for i in range(args.projects):
+        proj = client.post("/api/projects", headers=headers, json={"title": f"P{i}"}).get_json()
+        thread = client.post("/api/chatThreads", headers=headers,
+                             json={"title": "general", "projectId": proj["id"]}).get_json()
+        shared["projects"].append(proj["id"])
+        shared["threads"][proj["id"]] = thread["id"]
+
+    failures = []
+    threads = [
+        threading.Thread(target=worker, args=(i, args, shared, failures))
+        for i in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    problems = failures + check_invariants()
+    print(f"{args.threads * args.ops} ops on {args.threads} threads in {elapsed:.1f}s")
+    for p in problems[:20]:
+        print("FAIL", p)
+    print("invariants OK" if not problems else f"{len(problems)} problems")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# compress.py
+import os
+import zlib
+
+# Response compression negotiated from Accept-Encoding. gzip is always
+# available; brotli and zstd are offered when their packages are
+# installed. Whole bodies go through compress(), streamed ones through
+# compress_stream(), which flushes after every chunk so clients can
+# decode each chunk as it arrives.
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Set to 0 to send every response uncompressed.
+COMPRESS_ENABLED = os.environ.get("MILESTACK_COMPRESS", "1") != "0"
+# Bodies smaller than this are not worth compressing.
+COMPRESS_MIN_BYTES = int(os.environ.get("MILESTACK_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("MILESTACK_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("MILESTACK_BROTLI_QUALITY", 5))
+ZSTD_LEVEL = int(os.environ.get("MILESTACK_ZSTD_LEVEL", 3))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/css",
+                      "application/javascript")
+
+
+class _Gzip:
+    name = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return c.compress(data) + c.flush()
+
+    def stream(self, chunks):
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            out = c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield c.flush()
+
+
+class _Brotli:
+    name = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+
+    def stream(self, chunks):
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = c.process(chunk) + c.flush()
+            if out:
+                yield out
+        yield c.finish()
+
+
+class _Zstd:
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    def stream(self, chunks):
+        c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        for chunk in chunks:
+            out = c.compress(chunk) + c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if out:
+                yield out
+        yield c.flush()
+
+
+# Server preference, best ratio first; the client's q-values still win.
+CODECS = {}
+if brotli is not None:
+    CODECS["br"] = _Brotli()
+if zstandard is not None:
+    CODECS["zstd"] = _Zstd()
+CODECS["gzip"] = _Gzip()
+
+
+def negotiate(accept_encodings):
+    """
+    The codec name to use for a request's parsed Accept-Encoding
+    (werkzeug's ``request.accept_encodings``), or None.
+    """
+    if not COMPRESS_ENABLED or not accept_encodings:
+        return None
+    return accept_encodings.best_match(list(CODECS))
+
+
+def compressible(mimetype: str) -> bool:
+    return mimetype in COMPRESSIBLE_TYPES
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return CODECS[encoding].compress(data)
+
+
+def compress_stream(chunks, encoding: str):
+    return CODECS[encoding].stream(chunks)
@@ -0,0 +1,184 @@
+# events.py
+import os
+import secrets
+import threading
+from collections import deque
+
+import fastjson
+import records
+
+# Events remembered per project for Last-Event-ID resume.
+EVENT_HISTORY = int(os.environ.get("MILESTACK_SSE_HISTORY", 1000))
+# Events queued per subscriber before it is considered too slow and dropped.
+SUBSCRIBER_BUFFER = int(os.environ.get("MILESTACK_SSE_BUFFER", 256))
+# Concurrent event streams served by one worker process.
+MAX_STREAMS = int(os.environ.get("MILESTACK_SSE_MAX_STREAMS", 100))
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One client's bounded event buffer. When the client falls more than
+    ``SUBSCRIBER_BUFFER`` events behind it is closed instead of buffering
+    without limit; it reconnects with Last-Event-ID and catches up from
+    the project history.
+    """
+
+    def __init__(self, bus, projectId: str, buffer: int):
+        self.bus = bus
+        self.projectId = projectId
+        self.closed = False
+        # Called after each push, for consumers that do not block in get()
+        # (the ASGI server's event loop; see asgi.py).
+        self.waker = None
+        self._buffer = buffer
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._queue) >= self._buffer:
+                self.closed = True
+            else:
+                self._queue.append(event)
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+    def get(self, timeout: float):
+        """Next queued events; empty on timeout or once closed and drained."""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._queue)
+            self._queue.clear()
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self.bus.unsubscribe(self)
+
+
+class _Channel:
+    __slots__ = ("seq", "history", "subscribers")
+
+    def __init__(self, history: int):
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+
+
+class EventBus:
+    """
+    Per-project publish/subscribe with a bounded replay history.
+
+    The bus lives in one worker process. Event ids are ``<boot>-<seq>``,
+    where ``boot`` is random per bus, so an id handed out by another
+    worker or before a restart is recognized as unknown and answered with
+    a resync instead of being compared against an unrelated sequence.
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY,
+                 buffer: int = SUBSCRIBER_BUFFER,
+                 max_streams: int = MAX_STREAMS):
+        self.history = history
+        self.buffer = buffer
+        self.max_streams = max_streams
+        self.boot = secrets.token_hex(4)
+        self._channels = {}
+        self._streams = 0
+        self._lock = threading.Lock()
+
+    def _channel(self, projectId: str) -> _Channel:
+        ch = self._channels.get(projectId)
+        if ch is None:
+            ch = self._channels[projectId] = _Channel(self.history)
+        return ch
+
+    def publish(self, projectId: str, event_type: str, data) -> str:
+        """Serialize once and fan out to every subscriber of the project."""
+        payload = fastjson.dumps(data, default=_json_default)
+        with self._lock:
+            ch = self._channel(projectId)
+            ch.seq += 1
+            event = (ch.seq, f"{self.boot}-{ch.seq}", event_type, payload)
+            ch.history.append(event)
+            subscribers = list(ch.subscribers)
+
+        for sub in subscribers:
+            sub.push(event)
+        return event[1]
+
+    @property
+    def streams(self) -> int:
+        return self._streams
+
+    def _last_seq(self, last_event_id: str):
+        """Sequence number of one of this bus's event ids, else None."""
+        boot, _, seq = last_event_id.partition("-")
+        if boot != self.boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, projectId: str, last_event_id: str = None):
+        """
+        Returns (subscription, backlog). The backlog holds the events
+        after ``last_event_id``, or None when they are no longer in the
+        history, or the id was not issued by this bus, and the client has
+        to reload from the REST endpoints.
+        """
+        with self._lock:
+            if self._streams >= self.max_streams:
+                raise TooManyStreams()
+            self._streams += 1
+
+            ch = self._channel(projectId)
+            sub = Subscription(self, projectId, self.buffer)
+            ch.subscribers.add(sub)
+
+            backlog = []
+            if last_event_id:
+                last_seq = self._last_seq(last_event_id)
+                if last_seq is None or last_seq > ch.seq:
+                    backlog = None
+                elif last_seq < ch.seq:
+                    oldest = ch.history[0][0] if ch.history else ch.seq + 1
+                    if last_seq + 1 < oldest:
+                        backlog = None
+                    else:
+                        backlog = [e for e in ch.history if e[0] > last_seq]
+
+        return sub, backlog
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            ch = self._channels.get(sub.projectId)
+            if ch is None or sub not in ch.subscribers:
+                return
+            ch.subscribers.discard(sub)
+            self._streams -= 1
+
+
+def _json_default(obj):
+    if isinstance(obj, records.Record):
+        return obj.to_dict()
+    return str(obj)
+
+
+def format_event(event) -> str:
+    _, event_id, event_type, payload = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+bus = EventBus()
+
+
+def publish(projectId: str, event_type: str, data) -> str:
+    return bus.publish(projectId, event_type, data)
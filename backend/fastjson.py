@@ -0,0 +1,79 @@
+# fastjson.py
+import json
+import os
+
+from records import json_default
+
+# JSON encoding shared by responses, events, the journal and SQLite rows.
+# orjson is used when installed (it is several times faster than the
+# stdlib encoder and returns bytes directly); values it cannot encode,
+# such as integers beyond 64 bits, fall back to the stdlib encoder.
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# "auto" (orjson when installed), "orjson" or "stdlib".
+JSON_ENCODER = os.environ.get("MILESTACK_JSON", "auto")
+# Rows encoded per chunk of a streamed array.
+STREAM_CHUNK_ROWS = int(os.environ.get("MILESTACK_STREAM_CHUNK_ROWS", 500))
+
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise RuntimeError("MILESTACK_JSON=orjson but orjson is not installed")
+
+USE_ORJSON = orjson is not None and JSON_ENCODER != "stdlib"
+
+
+def _stdlib_dumps(obj, default) -> str:
+    return json.dumps(obj, separators=(",", ":"), default=default)
+
+
+def dumps_bytes(obj, default=json_default) -> bytes:
+    """Compact UTF-8 JSON for ``obj``; records are encoded as objects."""
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=default)
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_dumps(obj, default).encode("utf-8")
+
+
+def dumps(obj, default=json_default) -> str:
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=default).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_dumps(obj, default)
+
+
+def loads(data):
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def stream_array(rows, chunk_rows: int = STREAM_CHUNK_ROWS, guard=None):
+    """
+    Yield ``rows`` as one JSON array, ``chunk_rows`` rows per bytes chunk,
+    so the whole payload is never held encoded in memory. ``guard`` is an
+    optional context manager factory (e.g. models.reading) entered while
+    each chunk is encoded, for rows that writers may change in place.
+    """
+    yield b"["
+    first = True
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        if guard is not None:
+            with guard():
+                encoded = dumps_bytes(chunk)
+        else:
+            encoded = dumps_bytes(chunk)
+        body = encoded[1:-1]  # strip the chunk's own brackets
+        if first:
+            first = False
+            yield body
+        else:
+            yield b"," + body
+    yield b"]"
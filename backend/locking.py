@@ -0,0 +1,76 @@
+# locking.py
+import threading
+
+
+class RWLock:
+    """
+    Reader/writer lock guarding the in-memory db.
+
+    Any number of threads may read at once; a writer waits for them to
+    finish and then runs alone. Waiting writers hold back new readers so
+    a steady stream of reads cannot starve writes. Both sides are
+    reentrant, and the writing thread may also read, so helpers can call
+    each other freely. Upgrading a read to a write is not allowed.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, "reads", 0)
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        if self._writer == me or self._read_depth():
+            # Already inside a section of ours; waiting here could deadlock.
+            self._local.reads = self._read_depth() + 1
+            if self._writer != me:
+                with self._cond:
+                    self._readers += 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+
+    def release_read(self):
+        self._local.reads -= 1
+        if self._writer == threading.get_ident():
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> bool:
+        """Returns True when this starts the outermost write section."""
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            return False
+        if self._read_depth():
+            raise RuntimeError("cannot upgrade a read lock to a write lock")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+        return True
+
+    def release_write(self) -> bool:
+        """Returns True once the outermost write section has been left."""
+        self._write_depth -= 1
+        if self._write_depth:
+            return False
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
+        return True
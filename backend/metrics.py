@@ -0,0 +1,228 @@
+# metrics.py
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+# In-process metrics rendered in the Prometheus text exposition format at
+# GET /metrics (see app.py), and an opt-in profiler that keeps cProfile
+# stats of slow requests. Metrics are per worker process.
+
+# Set to 0 to turn request instrumentation and /metrics off.
+METRICS_ENABLED = os.environ.get("MILESTACK_METRICS", "1") != "0"
+# When set, /metrics requires "Authorization: Bearer <token>".
+METRICS_TOKEN = os.environ.get("MILESTACK_METRICS_TOKEN")
+# Profile this fraction of requests (0 = profiler off) ...
+PROFILE_SAMPLE = float(os.environ.get("MILESTACK_PROFILE_SAMPLE", 0))
+# ... and keep the stats of those slower than this many milliseconds ...
+PROFILE_SLOW_MS = float(os.environ.get("MILESTACK_PROFILE_SLOW_MS", 200))
+# ... as .prof files (readable with pstats or snakeviz) in this directory.
+PROFILE_DIR = os.environ.get("MILESTACK_PROFILE_DIR", "profiles")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DECODE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        lines = self.header()
+        names = self.labels + ("le",)
+        for key, (counts, total, n) in snapshot:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(
+                    f"{self.name}_bucket{_labels(names, key + (_number(bound),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {n}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Sampled when rendered: ``collect()`` yields (label values, value)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in self.collect()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels=(), collect=None):
+        return self.register(Gauge(name, help, labels, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    "milestack_request_duration_seconds", "Request latency by route.",
+    ("method", "route", "status"))
+response_bytes = registry.histogram(
+    "milestack_response_size_bytes", "Response body size by route.",
+    ("method", "route"), SIZE_BUCKETS)
+store_lookups = registry.counter(
+    "milestack_store_lookups_total",
+    "Collection reads by access path (id, index, ordered, scan, sort).",
+    ("collection", "path"))
+jwt_decode_seconds = registry.histogram(
+    "milestack_jwt_decode_seconds", "Time to decode and verify a JWT signature.",
+    (), DECODE_BUCKETS)
+token_cache_lookups = registry.counter(
+    "milestack_token_cache_lookups_total", "Verified-token cache lookups.", ("result",))
+
+
+# ------------------------------------------------------
+# Slow-request profiler
+# ------------------------------------------------------
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    """
+    Profiles a random ``sample`` of requests and writes the cProfile stats
+    of those that took at least ``slow_ms`` to ``directory``.
+    """
+
+    def __init__(self, sample: float = PROFILE_SAMPLE, slow_ms: float = PROFILE_SLOW_MS,
+                 directory: str = PROFILE_DIR):
+        self.sample = sample
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.enabled = sample > 0
+
+    def start(self):
+        """A running profiler for this request, or None when not sampled."""
+        if not self.enabled or random.random() >= self.sample:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None  # another profiler is active on this thread
+        return profile
+
+    def finish(self, profile, elapsed: float, method: str, route: str):
+        """Stop ``profile``; returns the file written, if the request was slow."""
+        profile.disable()
+        ms = elapsed * 1000
+        if ms < self.slow_ms:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = _SAFE.sub("_", f"{method}{route}").strip("_")
+        path = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{ms:.0f}ms-{uuid.uuid4().hex[:6]}.prof"
+        )
+        profile.dump_stats(path)
+        return path
+
+
+profiler = RequestProfiler()
@@ -1,16 +1,631 @@
 from typing import Dict, List
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import wraps
+import multiprocessing
+import os
+import threading
+import time
 import uuid
 
+import events
+import fastjson
+import locking
+import metrics
+import persistence
+import records
+import search
+import sqlstore
+
+# ======================================================
+# Collection engine
+# ======================================================
+
+def sort_key(value, ranks=None):
+    """
+    Comparable key of a sort field value: missing values last, ranked
+    fields (priority) by their rank, anything else as its string form.
+    """
+    if value is None:
+        return (1, "")
+    if ranks is not None:
+        return (0, ranks.get(value, 0))
+    return (0, str(value))
+
+
+class Collection:
+    """
+    Rows keyed by their ``id`` plus declared secondary hash indexes.
+
+    Each index maps a field (or tuple of fields) value to an insertion
+    ordered {id: row} bucket, so lookups and deletes are O(1) and
+    results keep the order rows were inserted in.
+
+    Ordered indexes, declared as (group fields, sort field, ranks), keep
+    one sorted list of (sort key, id) per group value for ordered(),
+    which pages through them by keyset cursor.
+    """
+
+    def __init__(self, name: str, indexes=(), record_type=None, ordered=()):
+        self.name = name
+        self.record_type = record_type
+        self._rows: Dict[str, dict] = {}
+        self._indexes: Dict[tuple, Dict] = {}
+        for fields in indexes:
+            if isinstance(fields, str):
+                fields = (fields,)
+            self._indexes[tuple(fields)] = {}
+        # (group fields, sort field) -> (ranks, {group value: [(key, id)]})
+        self._ordered: Dict[tuple, tuple] = {}
+        for group, field, ranks in ordered:
+            self._ordered[(tuple(group), field)] = (ranks, {})
+        self._indexed = {f for fields in self._indexes for f in fields}
+        for group, field in self._ordered:
+            self._indexed.update(group)
+            self._indexed.add(field)
+        self._watchers = []
+
+    def watch(self, fn):
+        """Call ``fn(row)`` whenever a row is added, removed or patched."""
+        self._watchers.append(fn)
+
+    def _notify(self, row: dict):
+        for fn in self._watchers:
+            fn(row)
+
+    def __iter__(self):
+        return iter(list(self._rows.values()))
+
+    def __len__(self):
+        return len(self._rows)
+
+    @staticmethod
+    def _key(fields: tuple, row: dict):
+        if len(fields) == 1:
+            return row.get(fields[0])
+        return tuple(row.get(f) for f in fields)
+
+    def _index_keys(self, row: dict):
+        """
+        Where ``row`` goes in each index, as ([(index, key)], [(lists, group
+        key, sort key)]). Raises TypeError for a value that cannot be a key
+        before any index has been touched.
+        """
+        hashed = [(index, self._key(fields, row)) for fields, index in self._indexes.items()]
+        ordered = [(lists, self._key(group, row), sort_key(row.get(field), ranks))
+                   for (group, field), (ranks, lists) in self._ordered.items()]
+        for _, key in hashed:
+            hash(key)
+        for _, key, _ in ordered:
+            hash(key)
+        return hashed, ordered
+
+    def _index_add(self, row: dict, keys=None):
+        hashed, ordered = keys or self._index_keys(row)
+        for index, key in hashed:
+            index.setdefault(key, {})[row["id"]] = row
+        for lists, key, skey in ordered:
+            insort(lists.setdefault(key, []), (skey, row["id"]))
+
+    def _index_remove(self, row: dict):
+        for fields, index in self._indexes.items():
+            key = self._key(fields, row)
+            bucket = index.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(row["id"], None)
+            if not bucket:
+                del index[key]
+        for (group, field), (ranks, lists) in self._ordered.items():
+            key = self._key(group, row)
+            entries = lists.get(key)
+            if entries is None:
+                continue
+            entry = (sort_key(row.get(field), ranks), row["id"])
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+                if not entries:
+                    del lists[key]
+
+    def get(self, obj_id):
+        return self._rows.get(obj_id)
+
+    def add(self, row: dict):
+        """Store ``row`` (as ``record_type`` if set) and return the stored row."""
+        if self.record_type is not None and type(row) is not self.record_type:
+            row = self.record_type(row)
+        keys = self._index_keys(row)
+        self._rows[row["id"]] = row
+        self._index_add(row, keys)
+        if self._watchers:
+            self._notify(row)
+        return row
+
+    def remove(self, obj_id):
+        row = self._rows.pop(obj_id, None)
+        if row is not None:
+            self._index_remove(row)
+            if self._watchers:
+                self._notify(row)
+        return row
+
+    def patch(self, row: dict, patch: dict):
+        """Apply ``patch`` to ``row`` in place, moving it between index buckets."""
+        reindex = any(f in self._indexed for f in patch)
+        if reindex:
+            # Fail on a bad value before watchers or indexes see anything.
+            self._index_keys({f: patch[f] if f in patch else row.get(f) for f in self._indexed})
+        if self._watchers:
+            self._notify(row)
+        if reindex:
+            self._index_remove(row)
+            row.update(patch)
+            self._index_add(row)
+        else:
+            row.update(patch)
+        if self._watchers:
+            self._notify(row)
+        return row
+
+    def candidates(self, query: dict):
+        """
+        Rows that may match ``query``, narrowed by the best usable index.
+        Callers still check every query field against the returned rows.
+        """
+        if "id" in query:
+            if metrics.METRICS_ENABLED:
+                metrics.store_lookups.inc(self.name, "id")
+            row = self._rows.get(query["id"])
+            return [row] if row is not None else []
+
+        best = None
+        for fields in self._indexes:
+            if all(f in query for f in fields):
+                if best is None or len(fields) > len(best):
+                    best = fields
+        if metrics.METRICS_ENABLED:
+            metrics.store_lookups.inc(self.name, "scan" if best is None else "index")
+        if best is None:
+            return self._rows.values()
+
+        key = query[best[0]] if len(best) == 1 else tuple(query[f] for f in best)
+        return self._indexes[best].get(key, {}).values()
+
+    def ordered(self, field: str, equals: dict, desc: bool = False, after=None,
+                greater=None, limit=None, ranks=None):
+        """
+        Rows whose fields equal ``equals`` and exceed ``greater`` ({field:
+        value}, missing values excluded), sorted by ``field`` then id, and
+        the cursor of the next page (None on the last one). ``after`` is
+        such a cursor, (sort key, id). Walks the ordered index with the
+        largest group that ``equals`` covers, else sorts candidates.
+        """
+        greater = {f: sort_key(v, ranks if f == field else None)
+                   for f, v in (greater or {}).items()}
+
+        best = None
+        for group, f in self._ordered:
+            if f == field and all(g in equals for g in group):
+                if best is None or len(group) > len(best):
+                    best = group
+        if best is not None:
+            if metrics.METRICS_ENABLED:
+                metrics.store_lookups.inc(self.name, "ordered")
+            ranks, lists = self._ordered[(best, field)]
+            entries = lists.get(self._key(best, equals), [])
+        else:
+            if metrics.METRICS_ENABLED:
+                metrics.store_lookups.inc(self.name, "sort")
+            entries = sorted(
+                (sort_key(row.get(field), ranks), row["id"])
+                for row in self.candidates(equals)
+            )
+
+        residual = {f: v for f, v in equals.items() if best is None or f not in best}
+        bound = greater.pop(field, None)
+        end = len(entries)
+        if bound is not None:
+            # Missing values sort last and never exceed the bound.
+            end = bisect_left(entries, (sort_key(None),))
+        if desc:
+            stop = end if after is None else min(end, bisect_left(entries, after))
+            keys = (entries[i] for i in range(stop - 1, -1, -1))
+        else:
+            start = 0 if after is None else bisect_right(entries, after)
+            if bound is not None:
+                start = max(start, bisect_right(entries, (bound, "\uffff")))
+            keys = (entries[i] for i in range(start, end))
+
+        rows = []
+        last = None
+        for key in keys:
+            if desc and bound is not None and key[0] <= bound:
+                break
+            row = self._rows[key[1]]
+            if any(row.get(f) != v for f, v in residual.items()):
+                continue
+            if any(row.get(f) is None or sort_key(row.get(f)) <= v
+                   for f, v in greater.items()):
+                continue
+            if limit is not None and len(rows) == limit:
+                return rows, last
+            rows.append(row)
+            last = key
+        return rows, None
+
+
+class _Ring:
+    """
+    Time-ordered rows of one feed. New rows are appended at the end and
+    the oldest are trimmed from the front, so reads never need to sort.
+    Positions are absolute (they survive trimming) and serve as cursors.
+    """
+
+    __slots__ = ("rows", "head", "offset", "live")
+
+    def __init__(self):
+        self.rows = []
+        self.head = 0      # index of the first slot that may be live
+        self.offset = 0    # absolute position of rows[0]
+        self.live = 0
+
+    def append(self, row: dict) -> int:
+        self.rows.append(row)
+        self.live += 1
+        return self.offset + len(self.rows) - 1
+
+    def discard(self, pos: int):
+        i = pos - self.offset
+        if self.head <= i < len(self.rows) and self.rows[i] is not None:
+            self.rows[i] = None
+            self.live -= 1
+            self._trim()
+
+    def _trim(self):
+        rows = self.rows
+        while self.head < len(rows) and rows[self.head] is None:
+            self.head += 1
+        if self.head > 64 and self.head * 2 > len(rows):
+            del rows[:self.head]
+            self.offset += self.head
+            self.head = 0
+
+    def oldest(self, n: int) -> List[dict]:
+        out = []
+        for row in self.rows[self.head:]:
+            if len(out) >= n:
+                break
+            if row is not None:
+                out.append(row)
+        return out
+
+    def newest(self, limit=None, before=None) -> List[dict]:
+        """Newest-first rows older than absolute position ``before``."""
+        i = len(self.rows) - 1
+        if before is not None:
+            i = min(i, before - self.offset - 1)
+
+        out = []
+        while i >= self.head and (limit is None or len(out) < limit):
+            row = self.rows[i]
+            if row is not None:
+                out.append(row)
+            i -= 1
+        return out
+
+
+class FeedCollection(Collection):
+    """
+    Rows additionally kept in one time-ordered ring per ``feed_key`` value
+    (a project's activities, a thread's messages).
+    """
+
+    feed_key = None
+
+    def __init__(self, name: str, indexes=(), record_type=None, ordered=()):
+        super().__init__(name, indexes, record_type, ordered)
+        self._feeds: Dict[str, _Ring] = {}
+        self._positions: Dict[str, int] = {}
+
+    def add(self, row: dict):
+        row = super().add(row)
+        key = row[self.feed_key]
+        ring = self._feeds.get(key)
+        if ring is None:
+            ring = self._feeds[key] = _Ring()
+        self._positions[row["id"]] = ring.append(row)
+        return row
+
+    def remove(self, obj_id):
+        row = super().remove(obj_id)
+        if row is not None:
+            key = row[self.feed_key]
+            ring = self._feeds[key]
+            ring.discard(self._positions.pop(obj_id))
+            if not ring.live:
+                del self._feeds[key]
+        return row
+
+    def count(self, key: str) -> int:
+        ring = self._feeds.get(key)
+        return ring.live if ring is not None else 0
+
+    def page(self, key: str, limit=None, before=None):
+        """
+        Newest-first rows of a feed. ``before`` is the id of the last row
+        of the previous page; returns None if it is unknown.
+        """
+        ring = self._feeds.get(key)
+        pos = None
+        if before is not None:
+            pos = self._positions.get(before)
+            if pos is None:
+                return None
+            if self._rows[before][self.feed_key] != key:
+                return None
+        if ring is None:
+            return []
+        return ring.newest(limit, pos)
+
+    def overflow(self, key: str, cap: int) -> List[dict]:
+        """Oldest rows of a feed beyond the newest ``cap``."""
+        ring = self._feeds.get(key)
+        if ring is None or ring.live <= cap:
+            return []
+        return ring.oldest(ring.live - cap)
+
+
+class ActivityLog(FeedCollection):
+    """Activities, in one ring per project."""
+    feed_key = "projectId"
+
+
+class MessageLog(FeedCollection):
+    """Append-only chat messages, in one ring per thread."""
+    feed_key = "threadId"
+
+
+class MemberCollection(Collection):
+    """
+    Project memberships, additionally kept as user -> {projectId: role}
+    and project -> {userId: role} maps so membership and role checks are
+    a pair of dict lookups. Each project's map lists leaders first.
+    """
+
+    def __init__(self, name: str, indexes=(), record_type=None, ordered=()):
+        super().__init__(name, indexes, record_type, ordered)
+        self._by_user: Dict[str, Dict[str, str]] = {}
+        self._by_project: Dict[str, Dict[str, str]] = {}
+
+    def _link(self, row: dict):
+        role = row.get("role", "member")
+        projectId, userId = row["projectId"], row["userId"]
+        self._by_user.setdefault(userId, {})[projectId] = role
+
+        members = self._by_project.get(projectId)
+        if members is None:
+            self._by_project[projectId] = {userId: role}
+        elif role != "leader" or all(r == "leader" for r in members.values()):
+            members[userId] = role
+        else:
+            # Leaders are rare: rebuild with this one after the other leaders.
+            ordered = {u: r for u, r in members.items() if r == "leader"}
+            ordered[userId] = role
+            ordered.update((u, r) for u, r in members.items() if r != "leader")
+            self._by_project[projectId] = ordered
+
+    def _unlink(self, row: dict):
+        for outer, inner, index in (
+            (row["userId"], row["projectId"], self._by_user),
+            (row["projectId"], row["userId"], self._by_project),
+        ):
+            entries = index.get(outer)
+            if entries is None:
+                continue
+            entries.pop(inner, None)
+            if not entries:
+                del index[outer]
+
+    def add(self, row: dict):
+        row = super().add(row)
+        self._link(row)
+        return row
+
+    def remove(self, obj_id):
+        row = super().remove(obj_id)
+        if row is not None:
+            self._unlink(row)
+        return row
+
+    def patch(self, row: dict, patch: dict):
+        self._unlink(row)
+        super().patch(row, patch)
+        self._link(row)
+        return row
+
+    def role(self, projectId: str, userId: str):
+        return self._by_user.get(userId, {}).get(projectId)
+
+    def projects_of(self, userId: str) -> Dict[str, str]:
+        return self._by_user.get(userId, {})
+
+    def members_of(self, projectId: str) -> Dict[str, str]:
+        return self._by_project.get(projectId, {})
+
+
+class TeammateViews:
+    """
+    Cached per-project teammate lists ({id, name, email, status, role},
+    leaders first), dropped whenever one of the project's memberships or
+    one of its members' user rows changes, and rebuilt on the next read.
+    """
+
+    def __init__(self, users: Collection, members: MemberCollection,
+                 cache: bool = True):
+        self.users = users
+        self.members = members
+        self.cache = cache
+        self._views: Dict[str, List[dict]] = {}
+        if cache:
+            members.watch(self._member_changed)
+            users.watch(self._user_changed)
+
+    def _member_changed(self, row: dict):
+        self._views.pop(row["projectId"], None)
+
+    def _user_changed(self, row: dict):
+        for projectId in self.members.projects_of(row["id"]):
+            self._views.pop(projectId, None)
+
+    def get(self, projectId: str) -> List[dict]:
+        """The shared cached list; callers must not modify it."""
+        view = self._views.get(projectId)
+        if view is None:
+            view = []
+            for userId, role in self.members.members_of(projectId).items():
+                u = self.users.get(userId)
+                if u:
+                    view.append({
+                        "id": u["id"],
+                        "name": u["name"],
+                        "email": u["email"],
+                        "status": u.get("status", "offline"),
+                        "role": role
+                    })
+            if self.cache:
+                self._views[projectId] = view
+        return view
+
+
+class ProjectSummaries:
+    """
+    Per-project task and milestone counters (by status, priority and
+    assignee; milestone progress), kept current from collection watchers
+    so a summary costs the number of distinct values, not of rows.
+    Without ``cache`` every summary is counted from the project's rows.
+    """
+
+    def __init__(self, tasks: Collection, milestones: Collection,
+                 cache: bool = True):
+        self.tasks = tasks
+        self.milestones = milestones
+        self.cache = cache
+        self._counts: Dict[str, dict] = {}
+        # (collection, id) -> (projectId, key) last counted for the row.
+        self._counted: Dict[tuple, tuple] = {}
+        if cache:
+            tasks.watch(self._watcher("tasks", tasks))
+            milestones.watch(self._watcher("milestones", milestones))
+
+    @staticmethod
+    def _key(collection: str, row: dict) -> tuple:
+        if collection == "tasks":
+            return (row.get("status"), row.get("priority"), row.get("assigneeId"))
+        try:
+            progress = float(row.get("progress") or 0)
+        except (TypeError, ValueError):
+            progress = 0.0
+        return (row.get("status"), progress)
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "tasks": 0, "byStatus": Counter(), "byPriority": Counter(),
+            "byAssignee": Counter(),
+            "milestones": 0, "milestonesByStatus": Counter(), "progress": 0.0,
+        }
+
+    @staticmethod
+    def _apply(counts: dict, collection: str, key: tuple, sign: int):
+        if collection == "tasks":
+            status, priority, assignee = key
+            counts["tasks"] += sign
+            counts["byStatus"][status] += sign
+            counts["byPriority"][priority] += sign
+            counts["byAssignee"][assignee] += sign
+        else:
+            status, progress = key
+            counts["milestones"] += sign
+            counts["milestonesByStatus"][status] += sign
+            counts["progress"] += sign * progress
+
+    def _watcher(self, collection: str, coll: Collection):
+        def refresh(row):
+            # Called on add, remove and around patches: move the row's
+            # contribution from what was counted to what is stored now.
+            ident = (collection, row["id"])
+            old = self._counted.pop(ident, None)
+            if old is not None:
+                counts = self._counts[old[0]]
+                self._apply(counts, collection, old[1], -1)
+                if not counts["tasks"] and not counts["milestones"]:
+                    del self._counts[old[0]]
+            projectId = row.get("projectId")
+            if projectId is None or coll.get(row["id"]) is None:
+                return
+            key = self._key(collection, row)
+            counts = self._counts.get(projectId)
+            if counts is None:
+                counts = self._counts[projectId] = self._empty()
+            self._apply(counts, collection, key, 1)
+            self._counted[ident] = (projectId, key)
+
+        return refresh
+
+    def _count(self, projectId: str) -> dict:
+        counts = self._empty()
+        for name, coll in (("tasks", self.tasks), ("milestones", self.milestones)):
+            for row in coll.candidates({"projectId": projectId}):
+                self._apply(counts, name, self._key(name, row), 1)
+        return counts
+
+    def get(self, projectId: str) -> dict:
+        if self.cache:
+            counts = self._counts.get(projectId) or self._empty()
+        else:
+            counts = self._count(projectId)
+
+        def nonzero(counter, skip_none=False):
+            return {k: n for k, n in counter.items()
+                    if n and not (skip_none and k is None)}
+
+        tasks = counts["tasks"]
+        done = counts["byStatus"].get("done", 0)
+        milestones = counts["milestones"]
+        return {
+            "tasks": {
+                "total": tasks,
+                "byStatus": nonzero(counts["byStatus"], skip_none=True),
+                "byPriority": nonzero(counts["byPriority"], skip_none=True),
+                "byAssignee": nonzero(counts["byAssignee"], skip_none=True),
+                "unassigned": counts["byAssignee"].get(None, 0),
+                "done": done,
+                "progress": round(100 * done / tasks, 1) if tasks else 0,
+            },
+            "milestones": {
+                "total": milestones,
+                "byStatus": nonzero(counts["milestonesByStatus"], skip_none=True),
+                "progress": round(counts["progress"] / milestones, 1) if milestones else 0,
+            },
+        }
+
+
 # ======================================================
 # In-memory DB
 # ======================================================
-db = {
-    "users": [],               # registered users
-    "projects": [],            # projects
-    "tasks": [],
-    "milestones": [],
-    "chat_threads": [],
+
+# Secondary indexes per collection; `id` is always the primary key.
+INDEXES = {
+    "users": ["email"],          # registered users
+    "projects": [],              # projects
+    "tasks": ["projectId"],
+    "milestones": ["projectId"],
+    "chat_threads": ["projectId"],
+    # {id, threadId, text, senderId, timestamp}
+    "chat_messages": [],
 
     # NEW — Activity Feed
     # {id, projectId, userId, description, timestamp}
@@ -18,31 +633,371 @@ db = {
 
     # NEW — Project members
     # {id, projectId, userId, role}
-    "project_members": [],
+    "project_members": ["projectId", "userId", ("projectId", "userId")],
 
     # NEW — Invites
     # {id, projectId, email, name, status}
-    "invites": []
+    "invites": ["projectId", "email"],
+}
+
+PRIORITY_RANK = {"low": 1, "medium": 2, "high": 3}
+
+# Ordered indexes per collection, as (group fields, sort field, ranks),
+# serving the filtered and sorted list queries (see query_sorted).
+_TASK_GROUPS = [("projectId",), ("projectId", "status"), ("projectId", "assigneeId")]
+ORDERED_INDEXES = {
+    "tasks": [(g, "updatedAt", None) for g in _TASK_GROUPS]
+             + [(g, "priority", PRIORITY_RANK) for g in _TASK_GROUPS],
+    "milestones": [(g, "dueDate", None) for g in [("projectId",), ("projectId", "status")]],
+}
+
+# Slotted row types used by the in-memory engine (see records.py).
+RECORD_TYPES = {
+    "users": records.record_type(
+        "User", ["id", "name", "email", "password_hash", "status"],
+        interned=["status"]),
+    "projects": records.record_type(
+        "Project", ["id", "title", "description", "status", "members"],
+        interned=["status"]),
+    "tasks": records.record_type(
+        "Task", ["id", "title", "description", "priority", "status", "assigneeId",
+                 "projectId", "createdAt", "updatedAt"],
+        times=["createdAt", "updatedAt"],
+        interned=["priority", "status"]),
+    "milestones": records.record_type(
+        "Milestone", ["id", "title", "description", "dueDate", "progress", "status",
+                      "projectId", "createdAt", "updatedAt"],
+        times=["createdAt", "updatedAt"],
+        interned=["status"]),
+    "chat_threads": records.record_type(
+        "ChatThread", ["id", "title", "projectId", "creatorId", "messageCount",
+                       "lastMessage", "createdAt", "updatedAt"],
+        times=["createdAt", "updatedAt"]),
+    "chat_messages": records.record_type(
+        "ChatMessage", ["id", "threadId", "text", "senderId", "timestamp"],
+        times=["timestamp"]),
+    "activities": records.record_type(
+        "Activity", ["id", "projectId", "userId", "description", "timestamp"],
+        times=["timestamp"]),
+    "project_members": records.record_type(
+        "ProjectMember", ["id", "projectId", "userId", "role"],
+        interned=["role"]),
+    "invites": records.record_type(
+        "Invite", ["id", "projectId", "email", "name", "status", "createdAt"],
+        times=["createdAt"],
+        interned=["status"]),
+}
+
+# Collections that need more than the generic engine.
+COLLECTION_TYPES = {
+    "activities": ActivityLog,
+    "chat_messages": MessageLog,
+    "project_members": MemberCollection,
 }
 
+# "memory" (process-local, optionally journaled; see load_db) or "sqlite"
+# (a database file shared by every worker; see sqlstore.py).
+STORAGE = os.environ.get("MILESTACK_STORAGE", "memory")
+
+sql = sqlstore.SqliteStorage() if STORAGE == "sqlite" else None
+
+
+def new_collection(name: str):
+    cls = COLLECTION_TYPES.get(name, Collection)
+    if sql is not None:
+        return sql.collection(
+            name, INDEXES[name],
+            feed_key=getattr(cls, "feed_key", None),
+            members=issubclass(cls, MemberCollection),
+            ordered=ORDERED_INDEXES.get(name, ()),
+        )
+    return cls(name, INDEXES[name], RECORD_TYPES.get(name),
+               ORDERED_INDEXES.get(name, ()))
+
+
+db = {name: new_collection(name) for name in INDEXES}
+
+# Other workers' writes cannot invalidate a process-local cache, so the
+# shared backend builds teammate views on every read.
+teammates = TeammateViews(db["users"], db["project_members"], cache=sql is None)
+summaries = ProjectSummaries(db["tasks"], db["milestones"], cache=sql is None)
+
+# Text indexed for GET /api/search, per collection.
+SEARCH_FIELDS = {
+    "tasks": ("title", "description"),
+    "milestones": ("title", "description"),
+    "chat_threads": ("title",),
+    "chat_messages": ("text",),
+}
+
+# With SQLite storage the index is a table in the shared database, written
+# in the same transaction as the row, so every worker finds every write.
+search_index = sqlstore.SqliteSearchIndex(sql) if sql else search.SearchIndex()
+
+
+def _search_watcher(collection: str):
+    coll = db[collection]
+    fields = SEARCH_FIELDS[collection]
+
+    def refresh(row):
+        # Called on add, remove and around patches: index what is stored now.
+        projectId = project_of(collection, row)
+        if projectId is None or coll.get(row["id"]) is None:
+            search_index.remove(collection, row["id"])
+            return
+        text = " ".join(str(row.get(f) or "") for f in fields)
+        search_index.index(collection, row["id"], projectId, text)
+
+    return refresh
+
+
+for _name in SEARCH_FIELDS:
+    db[_name].watch(_search_watcher(_name))
+
+# Durable store (WAL + snapshots), enabled by MILESTACK_DATA_DIR; see load_db().
+store = None
+
+# ======================================================
+# Concurrency
+# ======================================================
+
+# One reader/writer lock guards db together with everything derived from
+# it (member maps, teammate views, versions, change logs): write helpers
+# touch several of these at once, so per-collection locks would have to
+# be taken in a fixed order everywhere. Helpers below are marked @reads
+# or @writes; routes that need a consistent multi-step view use
+# `with reading():`. Journal records are queued under the lock, and the
+# outermost write section waits for their fsync after releasing it so
+# concurrent writers still share group commits. With SQLite storage the
+# outermost write section is also one transaction.
+db_lock = locking.RWLock()
+_journal = threading.local()
+
+
+@contextmanager
+def reading():
+    db_lock.acquire_read()
+    try:
+        yield
+    finally:
+        db_lock.release_read()
+
+
+@contextmanager
+def writing():
+    outermost = db_lock.acquire_write()
+    if outermost and sql is not None:
+        try:
+            sql.begin()
+        except BaseException:
+            db_lock.release_write()
+            raise
+    try:
+        yield
+    except BaseException:
+        if outermost and sql is not None:
+            sql.rollback()
+        raise
+    else:
+        if outermost and sql is not None:
+            sql.commit()
+    finally:
+        if db_lock.release_write():
+            lsn, _journal.lsn = getattr(_journal, "lsn", 0), 0
+            if lsn and store:
+                store.wal.wait(lsn)
+
+
+def _journaled(lsn: int):
+    _journal.lsn = max(getattr(_journal, "lsn", 0), lsn)
+
+
+def reads(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def writes(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with writing():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
 # ======================================================
 # Utility helpers
 # ======================================================
 
+# Newest activities kept per project; older ones are archived (0 = keep all).
+ACTIVITY_RETENTION = int(os.environ.get("MILESTACK_ACTIVITY_RETENTION", 5000))
+# JSON-lines file receiving activities trimmed by the retention cap.
+ACTIVITY_ARCHIVE = os.environ.get("MILESTACK_ACTIVITY_ARCHIVE")
+# Repeated "logged in" activities by one user within this many seconds are
+# dropped (0 = log every login).
+LOGIN_COALESCE_SECONDS = float(os.environ.get("MILESTACK_LOGIN_COALESCE_SECONDS", 0))
+
+
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 def gen_id(prefix: str) -> str:
     return f"{prefix}-{uuid.uuid4().hex[:8]}"
 
+def gen_ids(prefix: str, n: int) -> List[str]:
+    """``n`` ids like gen_id(), drawn from a single random read."""
+    raw = os.urandom(4 * n).hex()
+    return [f"{prefix}-{raw[i:i + 8]}" for i in range(0, 8 * n, 8)]
+
+
+# ======================================================
+# Project Versions
+# ======================================================
+
+# Collections whose changes are replayed to clients by changes_since().
+SYNC_COLLECTIONS = ("projects", "tasks", "milestones", "chat_threads", "project_members")
+# Changes remembered per project; older ones force a full resync.
+CHANGELOG_SIZE = int(os.environ.get("MILESTACK_CHANGELOG_SIZE", 1000))
+
+
+class _ChangeLog:
+    """
+    A project's recent (version, collection, id, op) entries. ``floor`` is
+    the newest version whose changes may have been dropped: clients that
+    are behind it need a full reload.
+    """
+
+    __slots__ = ("version", "entries", "floor")
+
+    def __init__(self, base: int):
+        self.version = base
+        self.entries = deque()
+        self.floor = base
+
+
+class VersionLog:
+    """
+    Per-project write counters and change logs. Counters start from the
+    process start time in microseconds, so versions keep increasing across
+    restarts and a client's version from an earlier process falls below
+    the floor (forcing a resync) instead of being mistaken for a current one.
+    """
+
+    def __init__(self, size: int = CHANGELOG_SIZE):
+        self.size = size
+        self.base = time.time_ns() // 1000
+        self.epoch = uuid.uuid4().hex[:8]
+        self._logs: Dict[str, _ChangeLog] = {}
+
+    def bump(self, projectId: str, collection: str, obj_id: str, op: str,
+             logged: bool) -> int:
+        log = self._logs.get(projectId)
+        if log is None:
+            log = self._logs[projectId] = _ChangeLog(self.base)
+        log.version += 1
+        if logged:
+            log.entries.append((log.version, collection, obj_id, op))
+            if len(log.entries) > self.size:
+                log.floor = log.entries.popleft()[0]
+        return log.version
+
+    def version(self, projectId: str) -> int:
+        log = self._logs.get(projectId)
+        return log.version if log is not None else self.base
+
+    def since(self, projectId: str, since: int):
+        """(version, floor, entries newer than ``since`` oldest-first)."""
+        log = self._logs.get(projectId)
+        if log is None:
+            return self.base, self.base, []
+        entries = []
+        for entry in reversed(log.entries):
+            if entry[0] <= since:
+                break
+            entries.append(entry)
+        entries.reverse()
+        return log.version, log.floor, entries
+
+
+versions = sqlstore.SqliteVersionLog(sql, CHANGELOG_SIZE) if sql else VersionLog()
+# Token revocations every worker sees (auth.TokenCache keeps its own otherwise).
+revocations = sqlstore.SqliteRevocations(sql) if sql else None
+
+
+def project_of(collection: str, row: dict):
+    """The project a row belongs to, or None for global rows (users)."""
+    if collection == "projects":
+        return row["id"]
+    if collection == "chat_messages":
+        thread = db["chat_threads"].get(row["threadId"])
+        return thread["projectId"] if thread else None
+    return row.get("projectId")
+
+
+def project_version(projectId: str) -> int:
+    return versions.version(projectId)
+
+
+def _touched(collection: str, row: dict, op: str):
+    projectId = project_of(collection, row)
+    if projectId is not None:
+        versions.bump(projectId, collection, row["id"], op,
+                      logged=collection in SYNC_COLLECTIONS)
+
+
+@reads
+def changes_since(projectId: str, since: int):
+    """
+    Returns (version, changes) with the project's sync-collection records
+    changed after version ``since``, one entry per record in the order of
+    its latest change:
+
+        {"collection", "id", "op": created|updated|deleted, "record"}
+
+    ``record`` is the current row, or None for deletions (tombstones).
+    Returns (version, None) when the change log no longer reaches back to
+    ``since`` (or ``since`` is from an earlier process) and the client has
+    to reload everything.
+    """
+    version, floor, entries = versions.since(projectId, since)
+    if since < floor or since > version:
+        return version, None
+
+    latest = {}
+    for v, collection, obj_id, op in reversed(entries):
+        key = (collection, obj_id)
+        first = latest.get(key)
+        if first is None:
+            latest[key] = [op, op]
+        else:
+            first[1] = op  # earliest op since ``since``
+
+    changes = []
+    for (collection, obj_id), (last_op, first_op) in reversed(latest.items()):
+        if last_op == "deleted":
+            record, op = None, "deleted"
+        else:
+            record = db[collection].get(obj_id)
+            op = "created" if first_op == "created" else "updated"
+        changes.append({"collection": collection, "id": obj_id, "op": op, "record": record})
+    return version, changes
+
 
 # ======================================================
 # CRUD Helpers
 # ======================================================
 
+@reads
 def find(collection: str, **query):
+    coll = db.get(collection)
+    if coll is None:
+        return []
+
     results = []
-    for item in db.get(collection, []):
+    for item in coll.candidates(query):
         match = True
         for k, v in query.items():
             if item.get(k) != v:
@@ -53,38 +1008,110 @@ def find(collection: str, **query):
     return results
 
 
+@reads
 def find_one(collection: str, key: str, value):
-    for item in db.get(collection, []):
+    coll = db.get(collection)
+    if coll is None:
+        return None
+
+    for item in coll.candidates({key: value}):
         if item.get(key) == value:
             return item
     return None
 
 
+@reads
+def query_sorted(collection: str, sort: str, equals: dict, desc: bool = False,
+                 after=None, greater=None, limit=None):
+    """
+    One page of rows matching ``equals`` (and ``greater`` lower bounds),
+    sorted by ``sort`` from its ordered index, plus the next page's cursor.
+    """
+    ranks = PRIORITY_RANK if sort == "priority" else None
+    return db[collection].ordered(sort, equals, desc=desc, after=after,
+                                  greater=greater, limit=limit, ranks=ranks)
+
+
+@writes
 def insert(collection: str, obj: dict):
-    db[collection].append(obj)
-    return obj
+    row = db[collection].add(obj)
+    _touched(collection, row, "created")
+    if store:
+        _journaled(store.log_insert(collection, obj, wait=False))
+    return row
 
 
+@writes
+def insert_many(collection: str, objs: List[dict]):
+    """Insert several rows, journaled together with a single fsync."""
+    coll = db[collection]
+    rows = []
+    for obj in objs:
+        row = coll.add(obj)
+        _touched(collection, row, "created")
+        rows.append(row)
+    if store and objs:
+        _journaled(store.log_insert_many(collection, objs, wait=False))
+    return rows
+
+
+@writes
+def insert_unique(collection: str, obj: dict, field: str):
+    """Insert ``obj`` unless a row with the same ``field`` value exists (None then)."""
+    if find_one(collection, field, obj[field]) is not None:
+        return None
+    return insert(collection, obj)
+
+
+@writes
 def update(collection: str, obj_id: str, patch: dict):
-    item = find_one(collection, "id", obj_id)
+    coll = db.get(collection)
+    item = coll.get(obj_id) if coll is not None else None
     if not item:
         return None
-    item.update(patch)
+    coll.patch(item, patch)
+    _touched(collection, item, "updated")
+    if store:
+        _journaled(store.log_update(collection, obj_id, patch, wait=False))
     return item
 
 
+@writes
 def delete(collection: str, obj_id: str):
-    item = find_one(collection, "id", obj_id)
-    if not item:
+    coll = db.get(collection)
+    row = coll.remove(obj_id) if coll is not None else None
+    if row is None:
         return False
-    db[collection].remove(item)
+    _touched(collection, row, "deleted")
+    if store:
+        _journaled(store.log_delete(collection, obj_id, wait=False))
     return True
 
 
+@writes
+def apply_changes(collection: str, creates=(), updates=(), deletes=()):
+    """
+    Insert ``creates``, apply (id, patch) ``updates`` and remove
+    ``deletes`` in one write section: readers and the version see the
+    batch all at once, and its journal records share one fsync. Returns
+    (created rows, updated rows, deleted ids); ids that are gone are
+    skipped.
+    """
+    created = insert_many(collection, list(creates)) if creates else []
+    updated = []
+    for obj_id, patch in updates:
+        row = update(collection, obj_id, patch)
+        if row is not None:
+            updated.append(row)
+    deleted = [obj_id for obj_id in deletes if delete(collection, obj_id)]
+    return created, updated, deleted
+
+
 # ======================================================
 # Activity System
 # ======================================================
 
+@writes
 def log_activity(projectId: str, userId: str, description: str):
     """
     Log an activity entry for a project.
@@ -106,23 +1133,100 @@ def log_activity(projectId: str, userId: str, description: str):
         "timestamp": now_iso(),
     }
     insert("activities", act)
+    enforce_activity_retention(projectId)
+    events.publish(projectId, "activity", act)
     return act
 
 
-def get_project_activities(projectId: str):
-    """Returns project activities sorted newest-first."""
+# (userId, description) -> monotonic time of the last bulk entry, for
+# coalescing; oldest first, so expired keys are dropped from the front.
+_last_bulk_activity: Dict[tuple, float] = OrderedDict()
+
+
+@writes
+def log_activities_bulk(projectIds, userId: str, description: str,
+                        coalesce: float = 0):
+    """
+    Log the same activity in many projects as one write: the entries
+    share a timestamp and are journaled together.
+
+    With ``coalesce`` > 0, nothing is logged if the same user already
+    logged this description less than ``coalesce`` seconds ago.
+    """
+    projectIds = list(projectIds)
+    if not projectIds:
+        return []
+
+    if coalesce:
+        now = time.monotonic()
+        key = (userId, description)
+        last = _last_bulk_activity.get(key)
+        if last is not None and now - last < coalesce:
+            return []
+        _last_bulk_activity[key] = now
+        _last_bulk_activity.move_to_end(key)
+        while True:
+            oldest, t = next(iter(_last_bulk_activity.items()))
+            if now - t < coalesce:
+                break
+            del _last_bulk_activity[oldest]
+
+    timestamp = now_iso()
     acts = [
-        a for a in db["activities"]
-        if a["projectId"] == projectId
+        {
+            "id": act_id,
+            "projectId": projectId,
+            "userId": userId,
+            "description": description,
+            "timestamp": timestamp,
+        }
+        for act_id, projectId in zip(gen_ids("act", len(projectIds)), projectIds)
     ]
-    acts.sort(key=lambda x: x["timestamp"], reverse=True)
+    insert_many("activities", acts)
+
+    for act in acts:
+        enforce_activity_retention(act["projectId"])
+        events.publish(act["projectId"], "activity", act)
     return acts
 
 
+@writes
+def enforce_activity_retention(projectId: str):
+    """Archive and drop a project's activities beyond ACTIVITY_RETENTION."""
+    if not ACTIVITY_RETENTION:
+        return
+
+    expired = db["activities"].overflow(projectId, ACTIVITY_RETENTION)
+    if not expired:
+        return
+
+    archive_activities(expired)
+    for act in expired:
+        delete("activities", act["id"])
+
+
+def archive_activities(acts: List[dict]):
+    if not ACTIVITY_ARCHIVE:
+        return
+    with open(ACTIVITY_ARCHIVE, "a", encoding="utf-8") as f:
+        for act in acts:
+            f.write(fastjson.dumps(act) + "\n")
+
+
+@reads
+def get_project_activities(projectId: str, limit: int = None, before: str = None):
+    """
+    Returns project activities newest-first, at most ``limit`` of them,
+    starting after the activity id ``before`` (None if that cursor is unknown).
+    """
+    return db["activities"].page(projectId, limit=limit, before=before)
+
+
 # ======================================================
 # Project Member Helpers
 # ======================================================
 
+@writes
 def add_member(projectId: str, userId: str, role: str = "member"):
     """Adds a user to a project with a role (default = member)."""
 
@@ -132,7 +1236,7 @@ def add_member(projectId: str, userId: str, role: str = "member"):
         entry = existing[0]
         # Only update role if they are not leader
         if entry.get("role") != "leader":
-            entry["role"] = role
+            entry = update("project_members", entry["id"], {"role": role})
         return entry
 
     entry = {
@@ -146,6 +1250,7 @@ def add_member(projectId: str, userId: str, role: str = "member"):
     return entry
 
 
+@writes
 def remove_member(projectId: str, userId: str):
     """Remove user from project unless they are leader."""
     entries = find("project_members", projectId=projectId, userId=userId)
@@ -158,28 +1263,29 @@ def remove_member(projectId: str, userId: str):
     return True
 
 
+@reads
 def get_project_members(projectId: str):
-    memberships = find("project_members", projectId=projectId)
-    users = []
+    """Teammate views of a project, leaders first (cached; do not modify)."""
+    return teammates.get(projectId)
+
 
-    for mem in memberships:
-        u = find_one("users", "id", mem["userId"])
-        if u:
-            users.append({
-                "id": u["id"],
-                "name": u["name"],
-                "email": u["email"],
-                "status": u.get("status", "offline"),
-                "role": mem.get("role", "member")
-            })
+@reads
+def member_role(projectId: str, userId: str):
+    """The user's role in the project, or None if they are not a member."""
+    return db["project_members"].role(projectId, userId)
 
-    return users
+
+@reads
+def get_user_projects(userId: str) -> Dict[str, str]:
+    """{projectId: role} for every project the user belongs to."""
+    return dict(db["project_members"].projects_of(userId))
 
 
 # ======================================================
 # Invite Helpers
 # ======================================================
 
+@writes
 def create_invite(projectId: str, email: str, name: str):
     invite = {
         "id": gen_id("invite"),
@@ -193,28 +1299,33 @@ def create_invite(projectId: str, email: str, name: str):
     return invite
 
 
+@reads
 def get_project_invites(projectId: str):
     return find("invites", projectId=projectId)
 
 
+@writes
 def mark_invite_accepted(inviteId: str):
-    inv = find_one("invites", "id", inviteId)
-    if inv:
-        inv["status"] = "accepted"
-    return inv
+    return update("invites", inviteId, {"status": "accepted"})
 
 
 # ======================================================
 # Chat Thread Helpers
 # ======================================================
 
+@writes
 def create_chat_thread(title: str, projectId: str, creatorId: str):
+    """
+    Threads only carry metadata plus the last message; the messages
+    themselves live in the append-only "chat_messages" collection.
+    """
     thread = {
         "id": gen_id("thread"),
         "title": title,
         "projectId": projectId,
         "creatorId": creatorId,
-        "messages": [],
+        "messageCount": 0,
+        "lastMessage": None,
         "createdAt": now_iso(),
         "updatedAt": now_iso(),
     }
@@ -222,15 +1333,72 @@ def create_chat_thread(title: str, projectId: str, creatorId: str):
     return thread
 
 
+@reads
 def get_chat_threads_by_project(projectId: str):
     return find("chat_threads", projectId=projectId)
 
 
+@writes
 def update_chat_thread(threadId: str, patch: dict):
     return update("chat_threads", threadId, patch)
 
 
+@writes
+def append_chat_message(threadId: str, text: str, senderId: str):
+    """Append a message to a thread in O(1) and refresh its summary fields."""
+    msg = {
+        "id": gen_id("msg"),
+        "threadId": threadId,
+        "text": text,
+        "senderId": senderId,
+        "timestamp": now_iso(),
+    }
+    msg = insert("chat_messages", msg)
+    update("chat_threads", threadId, {
+        "lastMessage": msg,
+        "messageCount": db["chat_messages"].count(threadId),
+        "updatedAt": msg["timestamp"],
+    })
+    return msg
+
+
+@reads
+def get_chat_messages(threadId: str, limit: int = None, before: str = None):
+    """
+    Returns up to ``limit`` messages older than message id ``before``
+    (newest when omitted), oldest-first. None if the cursor is unknown.
+    """
+    msgs = db["chat_messages"].page(threadId, limit=limit, before=before)
+    if msgs is None:
+        return None
+    msgs.reverse()
+    return msgs
+
+
+@reads
+def search_project(projectId: str, q: str, limit: int = 20, collections=None):
+    """
+    Newest-first rows of the project matching every word of ``q`` (words
+    match by prefix), as {collection, id, record}.
+    """
+    results = []
+    for collection, obj_id in search_index.query(projectId, q, limit, collections):
+        row = db[collection].get(obj_id)
+        if row is not None:
+            results.append({"collection": collection, "id": obj_id, "record": row})
+    return results
+
+
+@reads
+def project_summary(projectId: str) -> dict:
+    """Task and milestone counts and progress for the project dashboard."""
+    return summaries.get(projectId)
+
+
+@writes
 def delete_chat_thread(threadId: str):
+    for msg in db["chat_messages"].page(threadId):
+        delete("chat_messages", msg["id"])
     return delete("chat_threads", threadId)
 
 
@@ -239,9 +1407,35 @@ def delete_chat_thread(threadId: str):
 # ======================================================
 
 def normalize_db():
-    db.setdefault("project_members", [])
-    db.setdefault("invites", [])
-    db.setdefault("activities", [])
-    db.setdefault("chat_threads", [])
+    for name in INDEXES:
+        db.setdefault(name, new_collection(name))
+
+
+def load_db():
+    """
+    Prepare the db at startup. With MILESTACK_DATA_DIR set, the latest
+    snapshot is loaded and the write-ahead log tail replayed on top of it;
+    otherwise the process starts with empty in-memory collections. SQLite
+    storage is durable by itself and ignores MILESTACK_DATA_DIR.
+    """
+    global store
+    normalize_db()
+
+    data_dir = os.environ.get("MILESTACK_DATA_DIR")
+    # A child process started with spawn or forkserver (e.g. a password
+    # hashing worker, see auth.HashPool) re-runs the parent's script while
+    # it bootstraps; it must not open the parent's journal.
+    bootstrapping = getattr(multiprocessing.current_process(), "_inheriting", False)
+    if data_dir and store is None and sql is None and not bootstrapping:
+        store = persistence.Store(data_dir, db)
+
+    if sql is not None and not len(search_index):
+        # Databases written before the search table existed: index them once.
+        with writing():
+            for name in SEARCH_FIELDS:
+                refresh = _search_watcher(name)
+                for row in db[name]:
+                    refresh(row)
+    return store
 
-normalize_db()
+load_db()
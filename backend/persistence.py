@@ -0,0 +1,314 @@
+# persistence.py
+import glob
+import os
+import threading
+
+import fastjson
+
+# Log segments are named wal-<first lsn>.log, snapshots snapshot-<lsn>.jsonl.
+# A snapshot at lsn N already contains every operation up to and including N,
+# so recovery loads the newest snapshot and replays only records with lsn > N.
+# Rows are serialized while writes go on, so a snapshot may also hold some
+# field values written after N; updates set absolute values, so replaying
+# the records after N brings every such field to its final value anyway.
+
+GROUP_COMMIT_MS = float(os.environ.get("MILESTACK_WAL_GROUP_COMMIT_MS", 0))
+SNAPSHOT_EVERY = int(os.environ.get("MILESTACK_SNAPSHOT_EVERY", 100_000))
+SYNC_COMMIT = os.environ.get("MILESTACK_WAL_SYNC", "1") != "0"
+
+
+def _copy(row) -> dict:
+    # Rows may be patched meanwhile: copy before encoding, so the encoder
+    # never iterates a dict that changes size under it.
+    to_dict = getattr(row, "to_dict", None)
+    return to_dict() if to_dict is not None else row.copy()
+
+
+def _segment_lsn(path: str) -> int:
+    name = os.path.basename(path)
+    return int(name.split("-", 1)[1].split(".", 1)[0])
+
+
+class WriteAheadLog:
+    """
+    Append-only operation log with group-commit fsync.
+
+    Writers serialize their record and hand it to a background flusher,
+    which writes everything queued since the last round with a single
+    fsync. With ``sync=True`` append() returns only once that fsync has
+    covered the record, so many concurrent writers share one disk flush.
+    """
+
+    def __init__(self, data_dir: str, next_lsn: int = 1,
+                 group_commit_ms: float = GROUP_COMMIT_MS,
+                 sync: bool = SYNC_COMMIT):
+        self.data_dir = data_dir
+        self.group_commit = group_commit_ms / 1000.0
+        self.sync = sync
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._next_lsn = next_lsn
+        self._synced_lsn = next_lsn - 1
+        self._closed = False
+
+        self._file = open(self._segment_path(next_lsn), "ab")
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="milestack-wal", daemon=True
+        )
+        self._flusher.start()
+
+    def _segment_path(self, lsn: int) -> str:
+        return os.path.join(self.data_dir, f"wal-{lsn:020d}.log")
+
+    @property
+    def last_lsn(self) -> int:
+        return self._next_lsn - 1
+
+    def append(self, op: str, collection: str, payload, wait: bool = True) -> int:
+        return self.append_many(op, collection, [payload], wait)
+
+    def append_many(self, op: str, collection: str, payloads, wait: bool = True) -> int:
+        """
+        Append one record per payload under consecutive lsns, waiting for
+        a single fsync for all of them. Returns the last lsn. With
+        ``wait=False`` the records are only queued; pass the lsn to
+        wait() later, e.g. after releasing locks.
+        """
+        with self._cond:
+            lsn = self._next_lsn - 1
+            records = []
+            for payload in payloads:
+                lsn += 1
+                record = fastjson.dumps_bytes([lsn, op, collection, payload])
+                records.append(record + b"\n")
+            self._pending.extend(records)
+            self._next_lsn = lsn + 1
+            self._cond.notify_all()
+
+        if wait:
+            self.wait(lsn)
+        return lsn
+
+    def wait(self, lsn: int):
+        """With ``sync`` on, block until ``lsn`` has been fsync'd."""
+        if not self.sync:
+            return
+        with self._cond:
+            while self._synced_lsn < lsn and not self._closed:
+                self._cond.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+
+            # Let concurrent writers pile onto this round before syncing.
+            if self.group_commit:
+                threading.Event().wait(self.group_commit)
+
+            with self._cond:
+                batch, self._pending = self._pending, []
+                upto = self._next_lsn - 1
+                f = self._file
+
+            f.write(b"".join(batch))
+            f.flush()
+            os.fsync(f.fileno())
+
+            with self._cond:
+                self._synced_lsn = max(self._synced_lsn, upto)
+                self._cond.notify_all()
+
+    def flush(self):
+        """Block until everything appended so far is on disk."""
+        with self._cond:
+            target = self._next_lsn - 1
+            self._cond.notify_all()
+            while self._synced_lsn < target:
+                self._cond.wait()
+
+    def rotate(self) -> int:
+        """
+        Start a new segment after making the current one durable.
+        Returns the last lsn contained in the old segments.
+        """
+        self.flush()
+        with self._cond:
+            last = self._next_lsn - 1
+            old = self._file
+            self._file = open(self._segment_path(self._next_lsn), "ab")
+        old.close()
+        return last
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+
+class Store:
+    """
+    Durable wrapper around the in-memory collections: journals every
+    insert/update/delete and periodically compacts the log into a snapshot.
+    """
+
+    def __init__(self, data_dir: str, collections: dict,
+                 snapshot_every: int = SNAPSHOT_EVERY, **wal_options):
+        self.data_dir = data_dir
+        self.collections = collections
+        self.snapshot_every = snapshot_every
+        self._since_snapshot = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread = None
+
+        os.makedirs(data_dir, exist_ok=True)
+        last_lsn = self._recover()
+        self.wal = WriteAheadLog(data_dir, next_lsn=last_lsn + 1, **wal_options)
+
+    # --------------------------------------------------
+    # Recovery
+    # --------------------------------------------------
+
+    def _recover(self) -> int:
+        snap_lsn = self._load_snapshot()
+        last_lsn = snap_lsn
+
+        for path in sorted(glob.glob(os.path.join(self.data_dir, "wal-*.log"))):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        lsn, op, name, payload = fastjson.loads(line)
+                    except ValueError:
+                        # Torn write at the tail of the last segment.
+                        break
+                    if lsn <= snap_lsn:
+                        continue
+                    self._apply(op, name, payload)
+                    last_lsn = lsn
+
+        return last_lsn
+
+    def _load_snapshot(self) -> int:
+        snapshots = sorted(glob.glob(os.path.join(self.data_dir, "snapshot-*.jsonl")))
+        if not snapshots:
+            return 0
+
+        path = snapshots[-1]
+        with open(path, "rb") as f:
+            for line in f:
+                name, row = fastjson.loads(line)
+                coll = self.collections.get(name)
+                if coll is not None:
+                    coll.add(row)
+        return _segment_lsn(path)
+
+    def _apply(self, op: str, name: str, payload):
+        coll = self.collections.get(name)
+        if coll is None:
+            return
+        if op == "insert":
+            coll.add(payload)
+        elif op == "update":
+            row = coll.get(payload["id"])
+            if row is not None:
+                coll.patch(row, payload["patch"])
+        elif op == "delete":
+            coll.remove(payload)
+
+    # --------------------------------------------------
+    # Journaling
+    # --------------------------------------------------
+
+    # Each returns the record's lsn; ``wait=False`` defers the fsync wait
+    # to the caller (see WriteAheadLog.wait).
+
+    def log_insert(self, collection: str, row: dict, wait: bool = True) -> int:
+        return self._journal("insert", collection, row, wait)
+
+    def log_insert_many(self, collection: str, rows: list, wait: bool = True) -> int:
+        lsn = self.wal.append_many("insert", collection, rows, wait)
+        self._count(len(rows))
+        return lsn
+
+    def log_update(self, collection: str, obj_id: str, patch: dict,
+                   wait: bool = True) -> int:
+        return self._journal("update", collection, {"id": obj_id, "patch": patch}, wait)
+
+    def log_delete(self, collection: str, obj_id: str, wait: bool = True) -> int:
+        return self._journal("delete", collection, obj_id, wait)
+
+    def _journal(self, op: str, collection: str, payload, wait: bool) -> int:
+        lsn = self.wal.append(op, collection, payload, wait)
+        self._count(1)
+        return lsn
+
+    def _count(self, records: int):
+        self._since_snapshot += records
+        if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+            self.snapshot(background=True)
+
+    # --------------------------------------------------
+    # Snapshots
+    # --------------------------------------------------
+
+    def snapshot(self, background: bool = False):
+        """
+        Compact the log: list the current rows, start a new log segment and
+        write the rows out as snapshot-<lsn>.jsonl. Older segments and
+        snapshots are removed once the new snapshot is in place.
+
+        Only row references are taken here, in the caller's write section;
+        the rows are copied and serialized by _write_snapshot.
+        """
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            lsn = self.wal.rotate()
+            rows = [(name, list(coll)) for name, coll in self.collections.items()]
+            self._since_snapshot = 0
+        except BaseException:
+            self._snapshot_lock.release()
+            raise
+
+        if background:
+            self._snapshot_thread = threading.Thread(
+                target=self._write_snapshot, args=(lsn, rows),
+                name="milestack-snapshot", daemon=True,
+            )
+            self._snapshot_thread.start()
+        else:
+            self._write_snapshot(lsn, rows)
+
+    def _write_snapshot(self, lsn: int, rows: list):
+        try:
+            final = os.path.join(self.data_dir, f"snapshot-{lsn:020d}.jsonl")
+            tmp = final + ".tmp"
+            with open(tmp, "wb") as f:
+                for name, coll_rows in rows:
+                    for row in coll_rows:
+                        f.write(fastjson.dumps_bytes((name, _copy(row))))
+                        f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, final)
+
+            for path in glob.glob(os.path.join(self.data_dir, "snapshot-*.jsonl")):
+                if _segment_lsn(path) < lsn:
+                    os.remove(path)
+            for path in glob.glob(os.path.join(self.data_dir, "wal-*.log")):
+                if _segment_lsn(path) <= lsn:
+                    os.remove(path)
+        finally:
+            self._snapshot_lock.release()
+
+    def close(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.wal.close()
@@ -0,0 +1,140 @@
+# ratelimit.py
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+
+import metrics
+
+# Request rate limits, one token bucket per client and limit. Authenticated
+# requests are keyed on the token's user id (checked in auth.jwt_required),
+# anonymous ones on the client address (checked before the view; see
+# app.py). Limits are "<requests>/<seconds>": a client may burst up to
+# <requests> at once, then gets <requests> per <seconds> back. "0" turns
+# a limit off. Buckets are per worker process.
+
+# Set to 0 to turn rate limiting off.
+RATE_LIMIT_ENABLED = os.environ.get("MILESTACK_RATE_LIMIT", "1") != "0"
+# Default limit for authenticated requests, per user.
+USER_LIMIT = os.environ.get("MILESTACK_RATE_LIMIT_USER", "600/60")
+# Default limit for anonymous requests, per client address.
+IP_LIMIT = os.environ.get("MILESTACK_RATE_LIMIT_IP", "120/60")
+# Per-route limits by endpoint name; they replace the default for that route.
+ROUTE_LIMITS = os.environ.get(
+    "MILESTACK_RATE_LIMITS",
+    "login=10/60,signup=5/60,get_activities_route=120/60",
+)
+# Buckets kept per limit; the least recently used are dropped beyond this.
+MAX_BUCKETS = int(os.environ.get("MILESTACK_RATE_LIMIT_MAX_BUCKETS", 100_000))
+
+
+def parse_limit(spec: str):
+    """(requests, seconds) for "<requests>/<seconds>", or None for "0"."""
+    spec = spec.strip()
+    if spec in ("", "0"):
+        return None
+    count, _, seconds = spec.partition("/")
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"invalid rate limit {spec!r}")
+    return count, seconds
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets refilled lazily on access. A bucket that would have
+    refilled completely is the same as no bucket, so the oldest buckets
+    are dropped as soon as they reach that point; at most ``max_buckets``
+    are kept in any case.
+    """
+
+    def __init__(self, name: str, burst: int, seconds: float,
+                 max_buckets: int = MAX_BUCKETS):
+        self.name = name
+        self.burst = burst
+        self.rate = burst / seconds          # tokens per second
+        self.idle = seconds                  # time to refill from empty
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()        # key -> [tokens, last update]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now: float = None) -> float:
+        """
+        Spend one token for ``key``. Returns 0 when allowed, otherwise the
+        seconds until a token is available.
+        """
+        if now is None:
+            now = time.monotonic()
+        buckets = self._buckets
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [self.burst, now]
+                if len(buckets) > self.max_buckets:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                bucket[0] = tokens if tokens < self.burst else self.burst
+                bucket[1] = now
+
+            # Drop a couple of idle buckets per call; the oldest come first.
+            for _ in range(2):
+                oldest_key, oldest = next(iter(buckets.items()))
+                if now - oldest[1] < self.idle or oldest_key == key:
+                    break
+                del buckets[oldest_key]
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+def _limiter(name: str, spec: str):
+    limit = parse_limit(spec)
+    return TokenBucketLimiter(name, *limit) if limit else None
+
+
+user_limiter = _limiter("user", USER_LIMIT)
+ip_limiter = _limiter("ip", IP_LIMIT)
+route_limiters = {}
+for _item in filter(None, (s.strip() for s in ROUTE_LIMITS.split(","))):
+    _endpoint, _, _spec = _item.partition("=")
+    route_limiters[_endpoint.strip()] = _limiter(_endpoint.strip(), _spec)
+
+rate_limited = metrics.registry.counter(
+    "milestack_rate_limited_total", "Requests refused by a rate limit.", ("limit",))
+metrics.registry.gauge(
+    "milestack_rate_limit_buckets", "Token buckets held per limit.", ("limit",),
+    lambda: [((l.name,), len(l)) for l in (user_limiter, ip_limiter, *route_limiters.values())
+             if l is not None])
+
+
+def check(endpoint: str, key: str, authenticated: bool) -> float:
+    """
+    Seconds the client has to wait before calling ``endpoint`` again, or 0.
+    ``key`` is the user id for authenticated requests, else the address.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+    limiter = route_limiters.get(endpoint, user_limiter if authenticated else ip_limiter)
+    if limiter is None:
+        return 0.0
+    wait = limiter.take(key)
+    if wait:
+        rate_limited.inc(limiter.name)
+    return wait
+
+
+def too_many_requests(wait: float):
+    response = jsonify({"error": "rate limit exceeded"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(math.ceil(wait))
+    return response
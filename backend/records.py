@@ -0,0 +1,168 @@
+# records.py
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Compact row types for the in-memory engine. A record keeps each known
+# field in a slot instead of a per-row dict, stores timestamps as integer
+# microseconds since the epoch (rendered to ISO strings only when read),
+# and interns enum-like values so the many rows that repeat "todo" share
+# one string. Only fields with a small fixed set of values are interned:
+# ids and free text are unique per row and would just grow the
+# interpreter's intern table. Records still behave as read/write mappings,
+# so the helpers and routes can treat them as dicts.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+
+MISSING = _Missing()
+
+
+def iso_to_us(value):
+    """ISO-8601 string with an offset -> int microseconds; other values unchanged."""
+    if not isinstance(value, str):
+        return value
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if dt.tzinfo is None:
+        return value
+    return (dt - EPOCH) // _MICROSECOND
+
+
+def us_to_iso(value):
+    if type(value) is not int:
+        return value
+    return (EPOCH + value * _MICROSECOND).isoformat()
+
+
+class Record:
+    """
+    Base of the slotted row types made by record_type(). Fields outside
+    the declared ones go to a small ``_extra`` dict, created on demand.
+    """
+
+    __slots__ = ("_extra",)
+
+    FIELDS = ()
+    FIELD_SET = frozenset()
+    TIMES = frozenset()
+    INTERNED = frozenset()
+
+    def __init__(self, data=None, **kwargs):
+        for f in self.FIELDS:
+            setattr(self, f, MISSING)
+        self._extra = None
+        if data:
+            self.update(data)
+        if kwargs:
+            self.update(kwargs)
+
+    # Mapping protocol -------------------------------------------------
+
+    def __getitem__(self, key):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            return us_to_iso(value) if key in self.TIMES else value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELD_SET:
+            if key in self.TIMES:
+                value = iso_to_us(value)
+            elif key in self.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        if key in self.FIELD_SET:
+            return getattr(self, key) is not MISSING
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, other=(), **kwargs):
+        items = other.items() if hasattr(other, "items") else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def keys(self):
+        out = [f for f in self.FIELDS if getattr(self, f) is not MISSING]
+        if self._extra:
+            out.extend(self._extra)
+        return out
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def to_dict(self) -> dict:
+        # Hot path of every response: read the slots directly.
+        out = {}
+        times = self.TIMES
+        for f in self.FIELDS:
+            value = getattr(self, f)
+            if value is not MISSING:
+                out[f] = us_to_iso(value) if f in times else value
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record_type(name: str, fields, times=(), interned=()):
+    """A Record subclass with one slot per field in ``fields``."""
+    fields = tuple(fields)
+    return type(name, (Record,), {
+        "__slots__": fields,
+        "FIELDS": fields,
+        "FIELD_SET": frozenset(fields),
+        "TIMES": frozenset(times),
+        "INTERNED": frozenset(interned),
+    })
+
+
+def json_default(obj):
+    """``default=`` hook for json.dumps that serializes records."""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
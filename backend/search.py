@@ -0,0 +1,126 @@
+# search.py
+import heapq
+import re
+from bisect import bisect_left, insort
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str):
+    return _WORD.findall(text.lower()) if text else []
+
+
+class _ProjectIndex:
+    __slots__ = ("postings", "terms")
+
+    def __init__(self):
+        self.postings = {}   # term -> {docid}
+        self.terms = []      # sorted terms, for prefix lookups
+
+
+class SearchIndex:
+    """
+    In-process inverted index, one per project.
+
+    Every (re)indexed document gets a fresh, increasing doc id, so ranking
+    by recency is ranking by doc id. Query words match any indexed term
+    they are a prefix of; all words have to match.
+    """
+
+    def __init__(self):
+        self._projects = {}
+        self._docs = {}      # (collection, id) -> docid
+        self._info = {}      # docid -> (collection, id, projectId, terms)
+        self._next = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def index(self, collection: str, obj_id: str, projectId: str, text: str):
+        """
+        Add or replace a document. A document whose words changed becomes
+        the most recent one; re-indexing unchanged text is a no-op.
+        """
+        terms = frozenset(tokenize(text))
+        docid = self._docs.get((collection, obj_id))
+        if docid is not None:
+            _, _, old_project, old_terms = self._info[docid]
+            if old_project == projectId and old_terms == terms:
+                return
+        self.remove(collection, obj_id)
+        if not terms:
+            return
+
+        self._next += 1
+        docid = self._next
+        key = (collection, obj_id)
+        self._docs[key] = docid
+        self._info[docid] = (collection, obj_id, projectId, terms)
+
+        proj = self._projects.get(projectId)
+        if proj is None:
+            proj = self._projects[projectId] = _ProjectIndex()
+        for term in terms:
+            posting = proj.postings.get(term)
+            if posting is None:
+                proj.postings[term] = {docid}
+                insort(proj.terms, term)
+            else:
+                posting.add(docid)
+
+    def remove(self, collection: str, obj_id: str):
+        docid = self._docs.pop((collection, obj_id), None)
+        if docid is None:
+            return
+        _, _, projectId, terms = self._info.pop(docid)
+        proj = self._projects[projectId]
+        for term in terms:
+            posting = proj.postings[term]
+            posting.discard(docid)
+            if not posting:
+                del proj.postings[term]
+                del proj.terms[bisect_left(proj.terms, term)]
+        if not proj.postings:
+            del self._projects[projectId]
+
+    def _matching(self, proj: _ProjectIndex, word: str):
+        """Doc ids of every term starting with ``word``."""
+        terms = proj.terms
+        i = bisect_left(terms, word)
+        first = None
+        union = None
+        while i < len(terms) and terms[i].startswith(word):
+            posting = proj.postings[terms[i]]
+            if first is None:
+                first = posting
+            else:
+                if union is None:
+                    union = set(first)
+                union |= posting
+            i += 1
+        if union is not None:
+            return union
+        return first or set()
+
+    def query(self, projectId: str, q: str, limit: int = 20, collections=None):
+        """
+        (collection, id) of the newest ``limit`` documents of the project
+        matching every word of ``q``, newest first.
+        """
+        words = sorted(set(tokenize(q)), key=len, reverse=True)
+        proj = self._projects.get(projectId)
+        if not words or proj is None:
+            return []
+
+        # Longer words usually match fewer documents: start from those.
+        matches = sorted((self._matching(proj, w) for w in words), key=len)
+        if not matches[0]:
+            return []
+        found = matches[0]
+        if len(matches) > 1:
+            found = found.intersection(*matches[1:])
+
+        if collections:
+            info = self._info
+            found = [d for d in found if info[d][0] in collections]
+        return [self._info[d][:2] for d in heapq.nlargest(limit, found)]
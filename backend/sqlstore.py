@@ -0,0 +1,508 @@
+# sqlstore.py
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+import fastjson
+import metrics
+import search
+
+# SQLite storage backend, selected with MILESTACK_STORAGE=sqlite. Every
+# collection is a table of JSON rows plus one column per indexed field, so
+# several worker processes can share one database file. The classes mirror
+# the in-memory engine in models.py method for method.
+
+SQLITE_PATH = os.environ.get("MILESTACK_SQLITE_PATH", "milestack.db")
+# Seconds a writer waits for another process's transaction to finish.
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("MILESTACK_SQLITE_BUSY_TIMEOUT", 30))
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_value(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _dumps(row: dict) -> str:
+    return fastjson.dumps(row)
+
+
+class SqliteStorage:
+    """
+    One database file with a connection per thread. Connections run in
+    autocommit mode; begin()/commit() wrap a write section (see
+    models.writing) in a single IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self.conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+            (uuid.uuid4().hex[:8],),
+        )
+        self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=SQLITE_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def begin(self):
+        self.conn().execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.conn().execute("COMMIT")
+
+    def rollback(self):
+        self.conn().execute("ROLLBACK")
+
+    def collection(self, name: str, indexes=(), feed_key: str = None,
+                   members: bool = False, ordered=()):
+        if members:
+            cls = SqliteMemberCollection
+        elif feed_key:
+            cls = SqliteFeedCollection
+        else:
+            cls = SqliteCollection
+        return cls(self, name, indexes, feed_key, ordered)
+
+
+class SqliteCollection:
+    """A table of rows keyed by ``id``; see models.Collection."""
+
+    def __init__(self, storage: SqliteStorage, name: str, indexes=(), feed_key=None,
+                 ordered=()):
+        self.storage = storage
+        self.name = name
+        self.feed_key = feed_key
+        self._watchers = []
+        self._ranks = {field: ranks for _, field, ranks in ordered if ranks}
+
+        fields = []
+        index_defs = []
+        specs = list(indexes) + ([feed_key] if feed_key else [])
+        specs += [tuple(group) + (field,) for group, field, _ in ordered]
+        for spec in specs:
+            spec = (spec,) if isinstance(spec, str) else tuple(spec)
+            index_defs.append(spec)
+            for f in spec:
+                if f not in fields:
+                    fields.append(f)
+        self.fields = tuple(fields)
+
+        t = _quote(name)
+        cols = "".join(f", {_quote(f)}" for f in fields)
+        conn = storage.conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {t} (seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            f" id TEXT NOT NULL UNIQUE{cols}, data TEXT NOT NULL)"
+        )
+        # Databases created before a field was indexed: add and fill its column.
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_info({t})")}
+        for f in fields:
+            if f not in existing:
+                conn.execute(f"ALTER TABLE {t} ADD COLUMN {_quote(f)}")
+                conn.execute(
+                    f"UPDATE {t} SET {_quote(f)} = json_extract(data, ?)",
+                    ("$." + json.dumps(f),),
+                )
+        for spec in index_defs:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(name + '_' + '_'.join(spec))}"
+                f" ON {t} ({', '.join(_quote(f) for f in spec)}, seq)"
+            )
+
+        marks = ", ?" * len(fields)
+        sets = "".join(f"{_quote(f)} = ?, " for f in fields)
+        self._sql_insert = f"INSERT INTO {t} (id{cols}, data) VALUES (?{marks}, ?)"
+        self._sql_update = f"UPDATE {t} SET {sets}data = ? WHERE id = ?"
+        self._sql_get = f"SELECT data FROM {t} WHERE id = ?"
+        self._sql_delete = f"DELETE FROM {t} WHERE id = ? RETURNING data"
+        self._sql_all = f"SELECT data FROM {t} ORDER BY seq"
+        self._sql_count = f"SELECT COUNT(*) FROM {t}"
+        self._table = t
+
+    def _execute(self, sql: str, params=()):
+        return self.storage.conn().execute(sql, params)
+
+    def _rows(self, sql: str, params=()):
+        return [fastjson.loads(data) for (data,) in self._execute(sql, params)]
+
+    def watch(self, fn):
+        self._watchers.append(fn)
+
+    def _notify(self, row: dict):
+        for fn in self._watchers:
+            fn(row)
+
+    def __iter__(self):
+        return iter(self._rows(self._sql_all))
+
+    def __len__(self):
+        return self._execute(self._sql_count).fetchone()[0]
+
+    def get(self, obj_id):
+        found = self._execute(self._sql_get, (obj_id,)).fetchone()
+        return fastjson.loads(found[0]) if found else None
+
+    def add(self, row: dict):
+        values = [row.get(f) for f in self.fields]
+        self._execute(self._sql_insert, (row["id"], *values, _dumps(row)))
+        if self._watchers:
+            self._notify(row)
+        return row
+
+    def remove(self, obj_id):
+        found = self._execute(self._sql_delete, (obj_id,)).fetchone()
+        if found is None:
+            return None
+        row = fastjson.loads(found[0])
+        if self._watchers:
+            self._notify(row)
+        return row
+
+    def patch(self, row: dict, patch: dict):
+        if self._watchers:
+            self._notify(row)
+        row.update(patch)
+        values = [row.get(f) for f in self.fields]
+        self._execute(self._sql_update, (*values, _dumps(row), row["id"]))
+        if self._watchers:
+            self._notify(row)
+        return row
+
+    def candidates(self, query: dict):
+        if "id" in query:
+            if metrics.METRICS_ENABLED:
+                metrics.store_lookups.inc(self.name, "id")
+            row = self.get(query["id"])
+            return [row] if row is not None else []
+
+        used = [f for f in self.fields if f in query]
+        if metrics.METRICS_ENABLED:
+            metrics.store_lookups.inc(self.name, "index" if used else "scan")
+        if not used:
+            return self._rows(self._sql_all)
+        where = " AND ".join(f"{_quote(f)} = ?" for f in used)
+        return self._rows(
+            f"SELECT data FROM {self._table} WHERE {where} ORDER BY seq",
+            [query[f] for f in used],
+        )
+
+    def _sort_exprs(self, field: str):
+        """SQL for the (missing, value) sort key of models.sort_key."""
+        col = _quote(field)
+        ranks = self._ranks.get(field)
+        if ranks:
+            whens = " ".join(f"WHEN {_quote_value(k)} THEN {int(v)}" for k, v in ranks.items())
+            value = f"CASE WHEN {col} IS NULL THEN '' ELSE CASE {col} {whens} ELSE 0 END END"
+        else:
+            value = f"coalesce(CAST({col} AS TEXT), '')"
+        return f"({col} IS NULL)", value
+
+    def ordered(self, field: str, equals: dict, desc: bool = False, after=None,
+                greater=None, limit=None, ranks=None):
+        """Rows and next-page cursor; see models.Collection.ordered."""
+        if metrics.METRICS_ENABLED:
+            metrics.store_lookups.inc(self.name, "ordered")
+        missing, value = self._sort_exprs(field)
+        where = []
+        params = []
+        for f, v in equals.items():
+            if f in self.fields:
+                where.append(f"{_quote(f)} = ?")
+            else:
+                where.append("json_extract(data, ?) = ?")
+                params.append("$." + json.dumps(f))
+            params.append(v)
+        for f, v in (greater or {}).items():
+            if f == field and ranks:
+                where.append(f"({missing} = 0 AND {value} > ?)")
+                params.append(ranks.get(v, 0))
+            elif f in self.fields:
+                # NULL compares as NULL, so missing values are excluded.
+                where.append(f"CAST({_quote(f)} AS TEXT) > ?")
+                params.append(str(v))
+            else:
+                where.append("CAST(json_extract(data, ?) AS TEXT) > ?")
+                params += ["$." + json.dumps(f), str(v)]
+        if after is not None:
+            (a_missing, a_value), a_id = after
+            where.append(f"({missing}, {value}, id) {'<' if desc else '>'} (?, ?, ?)")
+            params += [a_missing, a_value, a_id]
+
+        direction = "DESC" if desc else "ASC"
+        sql = f"SELECT data, {missing}, {value}, id FROM {self._table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY 2 {direction}, 3 {direction}, id {direction}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        found = self._execute(sql, params).fetchall()
+        cursor = None
+        if limit is not None and len(found) > limit:
+            found = found[:limit]
+            _, m, v, obj_id = found[-1]
+            cursor = ((m, v), obj_id)
+        return [fastjson.loads(row[0]) for row in found], cursor
+
+
+class SqliteFeedCollection(SqliteCollection):
+    """Rows read per ``feed_key`` value in insertion order; see models.FeedCollection."""
+
+    def count(self, key: str) -> int:
+        return self._execute(
+            f"SELECT COUNT(*) FROM {self._table} WHERE {_quote(self.feed_key)} = ?", (key,)
+        ).fetchone()[0]
+
+    def page(self, key: str, limit=None, before=None):
+        fk = _quote(self.feed_key)
+        params = [key]
+        where = f"{fk} = ?"
+        if before is not None:
+            found = self._execute(
+                f"SELECT seq, {fk} FROM {self._table} WHERE id = ?", (before,)
+            ).fetchone()
+            if found is None or found[1] != key:
+                return None
+            where += " AND seq < ?"
+            params.append(found[0])
+        sql = f"SELECT data FROM {self._table} WHERE {where} ORDER BY seq DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._rows(sql, params)
+
+    def overflow(self, key: str, cap: int):
+        extra = self.count(key) - cap
+        if extra <= 0:
+            return []
+        return self._rows(
+            f"SELECT data FROM {self._table} WHERE {_quote(self.feed_key)} = ?"
+            f" ORDER BY seq LIMIT ?",
+            (key, extra),
+        )
+
+
+class SqliteMemberCollection(SqliteCollection):
+    """Project memberships; see models.MemberCollection."""
+
+    def role(self, projectId: str, userId: str):
+        found = self._execute(
+            f"SELECT json_extract(data, '$.role') FROM {self._table}"
+            f" WHERE projectId = ? AND userId = ?",
+            (projectId, userId),
+        ).fetchone()
+        return (found[0] or "member") if found else None
+
+    def projects_of(self, userId: str):
+        return dict(self._execute(
+            f"SELECT projectId, coalesce(json_extract(data, '$.role'), 'member')"
+            f" FROM {self._table} WHERE userId = ? ORDER BY seq",
+            (userId,),
+        ))
+
+    def members_of(self, projectId: str):
+        return dict(self._execute(
+            f"SELECT userId, coalesce(json_extract(data, '$.role'), 'member') AS role"
+            f" FROM {self._table} WHERE projectId = ?"
+            f" ORDER BY role = 'leader' DESC, seq",
+            (projectId,),
+        ))
+
+
+def _like_escape(word: str) -> str:
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SqliteSearchIndex:
+    """
+    Search index shared by all workers; see search.SearchIndex. Each
+    document's distinct terms are stored space-separated, so a query word
+    matches a term it is a prefix of with LIKE '% word%'.
+    """
+
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+        conn = storage.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_docs (docid INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " collection TEXT NOT NULL, id TEXT NOT NULL, projectId TEXT NOT NULL,"
+            " terms TEXT NOT NULL, UNIQUE (collection, id))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS search_docs_projectId ON search_docs (projectId, docid)"
+        )
+
+    def __len__(self):
+        return self.storage.conn().execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+
+    def index(self, collection: str, obj_id: str, projectId: str, text: str):
+        terms = sorted(set(search.tokenize(text)))
+        terms = f" {' '.join(terms)} " if terms else ""
+        conn = self.storage.conn()
+        found = conn.execute(
+            "SELECT projectId, terms FROM search_docs WHERE collection = ? AND id = ?",
+            (collection, obj_id),
+        ).fetchone()
+        if found is not None and tuple(found) == (projectId, terms):
+            return
+        self.remove(collection, obj_id)
+        if not terms:
+            return
+        conn.execute(
+            "INSERT INTO search_docs (collection, id, projectId, terms) VALUES (?, ?, ?, ?)",
+            (collection, obj_id, projectId, terms),
+        )
+
+    def remove(self, collection: str, obj_id: str):
+        self.storage.conn().execute(
+            "DELETE FROM search_docs WHERE collection = ? AND id = ?", (collection, obj_id)
+        )
+
+    def query(self, projectId: str, q: str, limit: int = 20, collections=None):
+        words = sorted(set(search.tokenize(q)), key=len, reverse=True)
+        if not words:
+            return []
+        where = ["projectId = ?"] + ["terms LIKE ? ESCAPE '\\'"] * len(words)
+        params = [projectId] + [f"% {_like_escape(w)}%" for w in words]
+        if collections:
+            where.append(f"collection IN ({', '.join('?' * len(collections))})")
+            params += list(collections)
+        return [tuple(r) for r in self.storage.conn().execute(
+            f"SELECT collection, id FROM search_docs WHERE {' AND '.join(where)}"
+            " ORDER BY docid DESC LIMIT ?",
+            params + [limit],
+        )]
+
+
+class SqliteVersionLog:
+    """Per-project versions and change log shared by all workers; see models.VersionLog."""
+
+    def __init__(self, storage: SqliteStorage, size: int):
+        self.storage = storage
+        self.size = size
+        self.epoch = storage.epoch
+        conn = storage.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS project_versions (projectId TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL, floor INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS changelog (projectId TEXT NOT NULL,"
+            " version INTEGER NOT NULL, collection TEXT NOT NULL, id TEXT NOT NULL,"
+            " op TEXT NOT NULL, PRIMARY KEY (projectId, version)) WITHOUT ROWID"
+        )
+
+    def bump(self, projectId: str, collection: str, obj_id: str, op: str,
+             logged: bool) -> int:
+        conn = self.storage.conn()
+        version = conn.execute(
+            "INSERT INTO project_versions (projectId, version) VALUES (?, 1)"
+            " ON CONFLICT (projectId) DO UPDATE SET version = version + 1"
+            " RETURNING version",
+            (projectId,),
+        ).fetchone()[0]
+        if not logged:
+            return version
+
+        conn.execute(
+            "INSERT INTO changelog (projectId, version, collection, id, op)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (projectId, version, collection, obj_id, op),
+        )
+        cutoff = conn.execute(
+            "SELECT version FROM changelog WHERE projectId = ?"
+            " ORDER BY version DESC LIMIT 1 OFFSET ?",
+            (projectId, self.size),
+        ).fetchone()
+        if cutoff is not None:
+            conn.execute(
+                "DELETE FROM changelog WHERE projectId = ? AND version <= ?",
+                (projectId, cutoff[0]),
+            )
+            conn.execute(
+                "UPDATE project_versions SET floor = ? WHERE projectId = ?",
+                (cutoff[0], projectId),
+            )
+        return version
+
+    def version(self, projectId: str) -> int:
+        found = self.storage.conn().execute(
+            "SELECT version FROM project_versions WHERE projectId = ?", (projectId,)
+        ).fetchone()
+        return found[0] if found else 0
+
+    def since(self, projectId: str, since: int):
+        conn = self.storage.conn()
+        found = conn.execute(
+            "SELECT version, floor FROM project_versions WHERE projectId = ?", (projectId,)
+        ).fetchone()
+        version, floor = found if found else (0, 0)
+        entries = conn.execute(
+            "SELECT version, collection, id, op FROM changelog"
+            " WHERE projectId = ? AND version > ? ORDER BY version",
+            (projectId, since),
+        ).fetchall()
+        return version, floor, entries
+
+
+class SqliteRevocations:
+    """Revoked tokens and users shared by all workers; see auth.TokenCache."""
+
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+        conn = storage.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens (digest BLOB PRIMARY KEY,"
+            " exp REAL NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_users (userId TEXT PRIMARY KEY,"
+            " before REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def revoke(self, key: bytes, exp: float, now: float) -> bool:
+        """False if ``key`` had been revoked already."""
+        conn = self.storage.conn()
+        conn.execute("DELETE FROM revoked_tokens WHERE exp <= ?", (now,))
+        return conn.execute(
+            "INSERT OR IGNORE INTO revoked_tokens (digest, exp) VALUES (?, ?)", (key, exp)
+        ).rowcount == 1
+
+    def revoke_user(self, user_id: str, before: float, horizon: float):
+        conn = self.storage.conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO revoked_users (userId, before) VALUES (?, ?)",
+            (user_id, before),
+        )
+        conn.execute("DELETE FROM revoked_users WHERE before <= ?", (horizon,))
+
+    def is_revoked(self, key: bytes, user_id, iat: float) -> bool:
+        return bool(self.storage.conn().execute(
+            "SELECT EXISTS (SELECT 1 FROM revoked_tokens WHERE digest = ?)"
+            " OR EXISTS (SELECT 1 FROM revoked_users WHERE userId = ? AND before > ?)",
+            (key, user_id, iat),
+        ).fetchone()[0])
@@ -0,0 +1,45 @@
+# tests/test_bulk.py
+"""
+A bulk request applies everything or nothing.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MILESTACK_HASH_WORKERS", "0")
+os.environ.setdefault("MILESTACK_RATE_LIMIT", "0")
+os.environ.pop("MILESTACK_DATA_DIR", None)
+
+from app import app  # noqa: E402
+from models import db, project_summary, project_version  # noqa: E402
+
+
+def test_mixed_valid_and_invalid_bulk_changes_nothing():
+    client = app.test_client()
+    token = client.post("/api/auth/signup", json={
+        "name": "Bulk", "email": "bulk@example.com", "password": "pw",
+    }).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    pid = client.post("/api/projects", headers=headers, json={"title": "P"}).get_json()["id"]
+    task = client.post("/api/tasks", headers=headers, json={
+        "projectId": pid, "title": "t", "priority": "low", "status": "todo",
+    }).get_json()
+
+    tasks_before = len(db["tasks"])
+    version = project_version(pid)
+    summary = project_summary(pid)
+
+    resp = client.post("/api/tasks/bulk", headers=headers, json={
+        "projectId": pid,
+        "create": [{"title": "new", "priority": "low", "status": "todo"}],
+        "update": [{"id": task["id"], "title": "changed", "status": ["x"]}],
+    })
+
+    assert resp.status_code == 400
+    assert "status" in resp.get_json()["error"]
+    assert len(db["tasks"]) == tasks_before
+    assert db["tasks"].get(task["id"])["title"] == "t"
+    assert project_version(pid) == version
+    assert project_summary(pid) == summary
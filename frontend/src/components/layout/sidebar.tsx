@@ -37,7 +37,7 @@ import {
 } from "@/components/ui/dropdown-menu";
 
 import { useEffect, useState } from "react";
-import { fetchProjects } from "@/lib/api";
+import { fetchProjects, logout as revokeSession } from "@/lib/api";
 
 /* -------------------------------------------------------
    EXPORT LOGO (Fix for LoginPage)
@@ -162,6 +162,7 @@ export default function AppSidebar() {
   ];
 
   const logout = () => {
+    revokeSession().catch(() => {});
     localStorage.removeItem("token");
     localStorage.removeItem("user");
     router.push("/login");
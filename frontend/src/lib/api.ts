@@ -125,6 +125,22 @@ export async function deleteTask(taskId: string) {
   });
 }
 
+export type BulkOperations = {
+  projectId: string;
+  create?: any[];
+  update?: ({ id: string } & Record<string, any>)[];
+  delete?: string[];
+};
+
+// Applies all operations atomically; one activity entry for the batch.
+export async function bulkTasks(ops: BulkOperations) {
+  return apiFetch(`${API_BASE}/api/tasks/bulk`, {
+    method: "POST",
+    headers: mergeHeaders({ "Content-Type": "application/json" }, getAuthHeaders()),
+    body: JSON.stringify(ops),
+  });
+}
+
 /* ---------------------------------------------------------
    MILESTONES
 --------------------------------------------------------- */
@@ -180,6 +196,14 @@ export async function deleteMilestone(milestoneId: string) {
   });
 }
 
+export async function bulkMilestones(ops: BulkOperations) {
+  return apiFetch(`${API_BASE}/api/milestones/bulk`, {
+    method: "POST",
+    headers: mergeHeaders({ "Content-Type": "application/json" }, getAuthHeaders()),
+    body: JSON.stringify(ops),
+  });
+}
+
 /* ---------------------------------------------------------
    CHAT THREADS
 --------------------------------------------------------- */
@@ -213,10 +237,23 @@ export async function sendChatMessage(threadId: string, message: {
   text: string;
   senderId: string;
 }) {
-  return apiFetch(`${API_BASE}/api/chatThreads/${threadId}`, {
-    method: "PUT",
+  return apiFetch(`${API_BASE}/api/chatThreads/${threadId}/messages`, {
+    method: "POST",
     headers: mergeHeaders({ "Content-Type": "application/json" }, getAuthHeaders()),
-    body: JSON.stringify({ message }),
+    body: JSON.stringify(message),
+  });
+}
+
+export async function fetchChatMessages(
+  threadId: string,
+  page: { limit?: number; before?: string } = {}
+) {
+  const params = new URLSearchParams();
+  if (page.limit) params.set("limit", String(page.limit));
+  if (page.before) params.set("before", page.before);
+
+  return apiFetch(`${API_BASE}/api/chatThreads/${threadId}/messages?${params}`, {
+    headers: mergeHeaders(getAuthHeaders()),
   });
 }
 
@@ -273,13 +310,108 @@ export async function removeTeammate(userId: string, projectId: string) {
 /* ---------------------------------------------------------
    ACTIVITY FEED (NEW)
 --------------------------------------------------------- */
-export async function fetchActivities(projectId: string) {
+export async function fetchActivities(
+  projectId: string,
+  page: { limit?: number; before?: string } = {}
+) {
+  const params = new URLSearchParams({ projectId });
+  if (page.limit) params.set("limit", String(page.limit));
+  if (page.before) params.set("before", page.before);
+
+  return apiFetch(`${API_BASE}/api/activities?${params}`, {
+    headers: mergeHeaders(getAuthHeaders()),
+  });
+}
+
+/* ---------------------------------------------------------
+   PROJECT SUMMARY
+--------------------------------------------------------- */
+export async function fetchProjectSummary(projectId: string) {
+  return apiFetch(`${API_BASE}/api/projects/${projectId}/summary`, {
+    headers: mergeHeaders(getAuthHeaders()),
+  });
+}
+
+/* ---------------------------------------------------------
+   DELTA SYNC
+--------------------------------------------------------- */
+export async function fetchProjectChanges(projectId: string, since: number) {
   return apiFetch(
-    `${API_BASE}/api/activities?projectId=${encodeURIComponent(projectId)}`,
+    `${API_BASE}/api/projects/${projectId}/changes?since=${since}`,
     { headers: mergeHeaders(getAuthHeaders()) }
   );
 }
 
+/* ---------------------------------------------------------
+   LIVE PROJECT EVENTS (SSE)
+--------------------------------------------------------- */
+export function subscribeProjectEvents(
+  projectId: string,
+  onEvent: (type: string, data: any) => void
+) {
+  const types = [
+    "activity",
+    "task.created", "task.updated", "task.deleted",
+    "milestone.created", "milestone.updated", "milestone.deleted",
+    "thread.created", "thread.updated", "thread.deleted",
+    "message.created",
+    "task.bulk", "milestone.bulk",
+    "resync",
+  ];
+  // A bulk change can touch many records at once; report it as a resync
+  // so subscribers refetch instead of patching their state item by item.
+  const refetch = new Set(["task.bulk", "milestone.bulk"]);
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let lastEventId = "";
+  let closed = false;
+
+  // EventSource cannot send the bearer token, so each connection uses a
+  // one-time ticket. The browser's own reconnect would reuse a spent
+  // ticket, so reconnect here with a fresh one, resuming after the last
+  // event seen.
+  const reconnect = () => {
+    source?.close();
+    source = null;
+    if (!closed) retry = setTimeout(connect, 3000);
+  };
+
+  const connect = async () => {
+    let ticket: string;
+    try {
+      ({ ticket } = await apiFetch(
+        `${API_BASE}/api/projects/${projectId}/events/ticket`,
+        { method: "POST", headers: mergeHeaders(getAuthHeaders()) }
+      ));
+    } catch {
+      return reconnect();
+    }
+    if (closed) return;
+
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) params.set("lastEventId", lastEventId);
+    source = new EventSource(
+      `${API_BASE}/api/projects/${projectId}/events?${params}`
+    );
+    for (const type of types) {
+      source.addEventListener(type, (e) => {
+        const message = e as MessageEvent;
+        if (message.lastEventId) lastEventId = message.lastEventId;
+        if (refetch.has(type)) onEvent("resync", {});
+        else onEvent(type, JSON.parse(message.data));
+      });
+    }
+    source.onerror = reconnect;
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+}
+
 /* ---------------------------------------------------------
    INVITES
 --------------------------------------------------------- */
@@ -317,3 +449,10 @@ export async function login(data: { email: string; password: string }) {
     body: JSON.stringify(data),
   });
 }
+
+export async function logout() {
+  return apiFetch(`${API_BASE}/api/auth/logout`, {
+    method: "POST",
+    headers: mergeHeaders(getAuthHeaders()),
+  });
+}